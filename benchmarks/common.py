@@ -0,0 +1,18 @@
+# Workload text shared by the benchmarks. Kept apart from ticket_pipeline so importing it doesn't pull
+# in that benchmark's dependencies.
+
+CATEGORIES = ("General Ticket 🎈", "Appeal Ticket 📜", "Report Ticket 📢", "Bug Report Ticket 🐛")
+OWNER_MESSAGES = (
+    "what's the server ip?",
+    "how do I get to the store",
+    "I was banned for no reason, how do I appeal",
+    "I bought a rank yesterday but it never showed up in game, my username is the one in the ticket",
+    "the server keeps kicking me with a timeout error whenever I join the survival world",
+    "hello?",
+    "someone griefed my base at spawn last night, can staff check the logs",
+)
+STAFF_MESSAGES = (
+    "Hi, I'm looking into this now.",
+    "Can you send a screenshot of the error?",
+    "This has been fixed, please try again.",
+)
@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+
+# Stand-ins for the interactions objects the ticket handlers touch. Every Discord API call sleeps for
+# `api_latency` seconds so handlers yield to the event loop the way they would against the real API.
+
+_snowflakes = itertools.count(1_300_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+class FakeAPI:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+
+class FakeRole:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class FakeUser:
+    def __init__(self, id: int, username: str, bot: bool = False, roles=()):
+        self.id = id
+        self.username = username
+        self.bot = bot
+        self.roles = [FakeRole(r) for r in roles]
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+
+class FakeMessage:
+    def __init__(self, api: FakeAPI, channel, author, content: str = "", attachments=()):
+        self.api = api
+        self.id = snowflake()
+        self.channel = channel
+        self.author = author
+        self.member = author
+        self.content = content
+        self.attachments = list(attachments)
+        self.data = {}
+
+    async def reply(self, content=None, **kwargs):
+        await self.api.call()
+        return FakeMessage(self.api, self.channel, self.channel.guild.me, content or "")
+
+    async def edit(self, content=None, **kwargs):
+        await self.api.call()
+        if content is not None:
+            self.content = content
+        return self
+
+
+class FakeChannel:
+    def __init__(self, api: FakeAPI, guild, id: int, name: str = ""):
+        self.api = api
+        self.guild = guild
+        self.id = id
+        self.name = name
+        self.permission_overwrites = []
+        self.edits = 0
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call()
+        return FakeMessage(self.api, self, self.guild.me, content or "")
+
+    async def edit(self, name=None, permission_overwrites=None, **kwargs):
+        await self.api.call()
+        self.edits += 1
+        if name is not None:
+            self.name = name
+        if permission_overwrites is not None:
+            self.permission_overwrites = permission_overwrites
+        return self
+
+    async def delete(self):
+        await self.api.call()
+        self.guild.channels.pop(self.id, None)
+
+    async def trigger_typing(self):
+        await self.api.call()
+
+
+class FakeGuild:
+    def __init__(self, api: FakeAPI):
+        self.api = api
+        self.id = snowflake()
+        self.me = FakeUser(snowflake(), "Bonk Tickets", bot=True)
+        self.channels = {}
+
+    def channel(self, channel_id) -> FakeChannel:
+        channel_id = int(channel_id)
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeChannel(self.api, self, channel_id)
+        return channel
+
+    async def create_text_channel(self, name: str, **kwargs) -> FakeChannel:
+        await self.api.call()
+        channel = self.channel(snowflake())
+        channel.name = name
+        channel.permission_overwrites = kwargs.get("permission_overwrites", [])
+        return channel
+
+
+class FakeModalContext:
+    def __init__(self, api: FakeAPI, responses: dict):
+        self.api = api
+        self.responses = responses
+
+    async def send(self, *args, **kwargs):
+        await self.api.call()
+
+
+class FakeContext:
+    # Covers both ComponentContext and SlashContext; ctx.bot is the context itself so that
+    # ctx.bot.wait_for_modal answers with the prepared modal responses.
+    def __init__(self, api: FakeAPI, guild: FakeGuild, author: FakeUser, channel: FakeChannel = None,
+                 values=(), responses: dict = None, panel: FakeChannel = None):
+        self.api = api
+        self.guild = guild
+        self.guild_id = guild.id
+        self.author = author
+        self.channel = channel
+        self.channel_id = channel.id if channel else None
+        self.values = list(values)
+        self.responses = responses or {}
+        self.message = FakeMessage(api, panel or channel, guild.me)
+        self.bot = self
+
+    async def defer(self, ephemeral: bool = False):
+        await self.api.call()
+
+    async def send(self, *args, **kwargs):
+        await self.api.call()
+
+    async def send_modal(self, modal):
+        await self.api.call()
+
+    async def wait_for_modal(self, modal):
+        return FakeModalContext(self.api, self.responses)
+
+
+class FakeMessageCreate:
+    def __init__(self, message: FakeMessage):
+        self.message = message
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+# A local stand-in for the chat completions endpoint, so the real AsyncOpenAI client, its connection
+# pool and the streaming path are all exercised without network access or API spend.
+
+REPLY_WORDS = (
+    "Thanks for reaching out! Please make sure you are connecting to play.bonkmc.net on a supported "
+    "version and let us know the exact error message so the team can take a closer look."
+).split()
+
+
+class StubOpenAI:
+    def __init__(self, first_token_latency: float = 0.3, token_latency: float = 0.02,
+                 reply_tokens: int = 40, host: str = "127.0.0.1"):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.reply_tokens = reply_tokens
+        self.host = host
+        self.requests = 0
+        self.prompt_tokens = 0
+        self._runner = None
+        self.base_url = None
+
+    def _reply(self):
+        return [("" if i == 0 else " ") + random.choice(REPLY_WORDS) for i in range(self.reply_tokens)]
+
+    def _chunk(self, delta: dict = None, finish_reason=None, usage: dict = None) -> bytes:
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage is not None:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    async def completions(self, request: web.Request):
+        body = await request.json()
+        self.requests += 1
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        self.prompt_tokens += prompt_tokens
+        pieces = self._reply()
+        await asyncio.sleep(self.first_token_latency)
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.token_latency * len(pieces))
+            return web.json_response({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4o",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(pieces)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(pieces),
+                    "total_tokens": prompt_tokens + len(pieces),
+                },
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(self._chunk({"role": "assistant", "content": ""}))
+        for piece in pieces:
+            await response.write(self._chunk({"content": piece}))
+            await asyncio.sleep(self.token_latency)
+        await response.write(self._chunk({}, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(self._chunk(usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(pieces),
+                "total_tokens": prompt_tokens + len(pieces),
+            }))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{self.host}:{port}/v1"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
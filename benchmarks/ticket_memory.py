@@ -0,0 +1,180 @@
+"""
+Per-ticket memory footprint of the in-memory ticket model.
+
+Builds the same generated tickets twice from their serialized JSON, once with the current slotted
+Ticket and once with a copy of the plain attribute model it replaced, and reports the bytes each
+keeps alive per ticket, with and without transcripts loaded. It also checks that both serialize back
+to the exact input.
+
+    python -m benchmarks.ticket_memory --tickets 20000 --logs-per-ticket 10 --output memory_results.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.common import CATEGORIES, OWNER_MESSAGES
+from utils.tickethandler import LOG_MESSAGE, Ticket, make_log_entry
+
+
+class PlainIGN:
+    def __init__(self, username: str):
+        self.username = username
+
+    def to_dict(self):
+        return {"username": self.username}
+
+
+class PlainTicket:
+    # The model before it was slotted: one __dict__ per ticket, ISO string timestamps, per-instance
+    # status and category strings and a dict per log entry (here holding today's structured entries).
+    def __init__(self, data: dict):
+        ign = data.get("ign")
+        self.ticket_id = data.get("ticket_id")
+        self.user_id = data.get("user_id")
+        self.channel_id = data.get("channel_id")
+        self.subject = data.get("subject", "")
+        self.reason = data.get("reason", "")
+        self.category = data.get("category", "General Support")
+        self.ign = PlainIGN(ign.get("username", "")) if ign else None
+        self.status = data.get("status", "open")
+        self.created_at = data.get("created_at")
+        self.updated_at = data.get("updated_at")
+        self._logs = data.get("logs")
+        self.log_loader = None
+        self.last_closed_at = data.get("last_closed_at")
+        self.last_reopened_at = data.get("last_reopened_at")
+        self.authors = data.get("authors")
+
+    def to_dict(self, include_logs: bool = True) -> dict:
+        data = {
+            "ticket_id": self.ticket_id,
+            "user_id": self.user_id,
+            "channel_id": self.channel_id,
+            "subject": self.subject,
+            "reason": self.reason,
+            "category": self.category,
+            "ign": self.ign.to_dict() if self.ign else None,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "logs": self._logs,
+            "last_closed_at": self.last_closed_at,
+            "last_reopened_at": self.last_reopened_at,
+        }
+        if self.authors:
+            data["authors"] = self.authors
+        if not include_logs:
+            del data["logs"]
+        return data
+
+
+MODELS = {
+    "before": PlainTicket,
+    "after": Ticket.from_dict,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--logs-per-ticket", type=int, default=10)
+    parser.add_argument("--open-ratio", type=float, default=0.2, help="fraction of tickets left open")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="memory_results.json")
+    return parser.parse_args(argv)
+
+
+def generate_tickets(args, rng: random.Random) -> list:
+    start = datetime.now(timezone.utc) - timedelta(days=90)
+    tickets = []
+    for number in range(1, args.tickets + 1):
+        user_id = str(rng.randrange(10 ** 17, 10 ** 18))
+        created = start + timedelta(seconds=rng.randrange(90 * 86400))
+        logs = []
+        at = created
+        for i in range(args.logs_per_ticket):
+            at += timedelta(seconds=rng.randrange(1, 600), microseconds=rng.randrange(10 ** 6))
+            author = user_id if i % 2 == 0 else "1240327290290700449"
+            logs.append(make_log_entry(
+                at.isoformat(), rng.choice(OWNER_MESSAGES), LOG_MESSAGE, author, str(rng.randrange(10 ** 17, 10 ** 18))
+            ))
+        closed = rng.random() >= args.open_ratio
+        tickets.append({
+            "ticket_id": str(number).zfill(3) if number < 1000 else str(number).zfill(4),
+            "user_id": user_id,
+            "channel_id": str(rng.randrange(10 ** 17, 10 ** 18)),
+            "subject": "General Ticket Ticket",
+            "reason": "Generated for the benchmark",
+            "category": rng.choice(CATEGORIES),
+            "ign": {"username": f"player{user_id[-6:]}"},
+            "status": "closed" if closed else "open",
+            "created_at": created.isoformat(),
+            "updated_at": at.isoformat(),
+            "logs": logs,
+            "last_closed_at": at.isoformat() if closed else None,
+            "last_reopened_at": None,
+            "authors": {user_id: f"player{user_id[-6:]}", "1240327290290700449": "staff"},
+        })
+    return tickets
+
+
+def measure(build, blob: str) -> tuple:
+    # Traces the parse as well as the build, so strings a model keeps from the parsed JSON are counted
+    # and ones it replaces are not.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        parsed = json.loads(blob)
+        tickets = [build(data) for data in parsed]
+        del parsed
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return current, tickets
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tickets = generate_tickets(args, random.Random(args.seed))
+    without_logs = json.dumps([{key: value for key, value in data.items() if key != "logs"} for data in tickets])
+    with_logs = json.dumps(tickets)
+
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "bytes_per_ticket": {},
+    }
+    for name, build in MODELS.items():
+        footprint = {}
+        for label, blob, include_logs in (("metadata", without_logs, False), ("with_logs", with_logs, True)):
+            current, built = measure(build, blob)
+            footprint[label] = round(current / len(tickets), 1)
+            serialized = json.dumps([ticket.to_dict(include_logs=include_logs) for ticket in built])
+            if serialized != blob:
+                raise AssertionError(f"{name} model does not serialize back to its input")
+            del built
+        results["bytes_per_ticket"][name] = footprint
+    before, after = results["bytes_per_ticket"]["before"], results["bytes_per_ticket"]["after"]
+    results["reduction"] = {label: round(1 - after[label] / before[label], 3) for label in before}
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps({"bytes_per_ticket": results["bytes_per_ticket"], "reduction": results["reduction"]}, indent=4))
+    print(f"Results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
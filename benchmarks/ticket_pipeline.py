@@ -0,0 +1,442 @@
+"""
+Offline load benchmark for the ticket pipeline.
+
+Generates a dataset of tickets and GPT conversations in a scratch directory, imports the real
+command handlers against it with fake Discord contexts and a local stub of the OpenAI endpoint,
+then drives ticket creation, messages, close, reopen and delete at the requested rates.
+
+    python -m benchmarks.ticket_pipeline --tickets 10000 --duration 60 --output bench_results.json
+
+Requires the bot's normal dependencies; no Discord token, OpenAI key or network access is needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.common import CATEGORIES, OWNER_MESSAGES, STAFF_MESSAGES
+from benchmarks.fakes import FakeAPI, FakeContext, FakeGuild, FakeMessage, FakeMessageCreate, FakeUser, snowflake
+from benchmarks.stub_openai import StubOpenAI
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=1000, help="tickets in the generated dataset")
+    parser.add_argument("--logs-per-ticket", type=int, default=10)
+    parser.add_argument("--conversation-ratio", type=float, default=0.3,
+                        help="fraction of open tickets that start with a GPT conversation")
+    parser.add_argument("--open-ratio", type=float, default=0.2, help="fraction of dataset tickets left open")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--snapshot-format", choices=("json", "binary"), default="json",
+                        help="snapshot format for the json storage")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load to drive")
+    parser.add_argument("--create-rate", type=float, default=2.0, help="ticket creations per second")
+    parser.add_argument("--message-rate", type=float, default=20.0, help="ticket messages per second")
+    parser.add_argument("--staff-ratio", type=float, default=0.3, help="fraction of messages sent by staff")
+    parser.add_argument("--close-rate", type=float, default=1.0)
+    parser.add_argument("--reopen-rate", type=float, default=0.5)
+    parser.add_argument("--delete-rate", type=float, default=0.5)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="simulated Discord API latency")
+    parser.add_argument("--openai-first-token", type=float, default=0.3)
+    parser.add_argument("--openai-token-latency", type=float, default=0.02)
+    parser.add_argument("--debounce", type=float, default=0.5, help="gpt_debounce_seconds for the run")
+    parser.add_argument("--gpt-max-concurrency", type=int, default=4)
+    parser.add_argument("--gpt-requests-per-minute", type=int, default=500)
+    parser.add_argument("--gpt-tokens-per-minute", type=int, default=30000)
+    parser.add_argument("--gpt-max-queue", type=int, default=50)
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="how long to wait for queued replies once the load stops")
+    parser.add_argument("--flush-interval", type=float, default=5.0)
+    parser.add_argument("--flush-threshold", type=int, default=50)
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="event loop lag sampling interval")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="directory for the generated data (default: a temp dir, removed afterwards)")
+    parser.add_argument("--output", default="bench_results.json")
+    return parser.parse_args(argv)
+
+
+def percentiles(samples) -> dict:
+    samples = sorted(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": samples[-1] if samples else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def timed(self, name: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        except Exception as e:
+            errors = self.errors.setdefault(name, {"count": 0, "first": None})
+            errors["count"] += 1
+            errors["first"] = errors["first"] or repr(e)
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def report(self) -> dict:
+        return {
+            name: {**percentiles(samples), "errors": self.errors.get(name, {}).get("count", 0),
+                   "first_error": self.errors.get(name, {}).get("first")}
+            for name, samples in sorted(self.samples.items())
+        }
+
+
+class LagSamples(list):
+    # Takes the place of the histogram metrics.LoopLagMonitor observes into, keeping every sample so
+    # exact percentiles can be reported.
+    def observe(self, value: float):
+        self.append(value)
+
+
+def write_config(home: str, args):
+    cfg_dir = os.path.join(home, ".pyconfig")
+    os.makedirs(cfg_dir, exist_ok=True)
+    with open(os.path.join(cfg_dir, "secrets.ini"), "w") as f:
+        f.write(
+            "[main]\n"
+            "bonk_staff_token = benchmark\n"
+            "openai_key = sk-benchmark\n"
+            "openai_max_retries = 0\n"
+            f"ticket_storage = {args.storage}\n"
+            f"snapshot_format = {args.snapshot_format}\n"
+            f"gpt_debounce_seconds = {args.debounce}\n"
+            f"gpt_max_concurrency = {args.gpt_max_concurrency}\n"
+            f"gpt_requests_per_minute = {args.gpt_requests_per_minute}\n"
+            f"gpt_tokens_per_minute = {args.gpt_tokens_per_minute}\n"
+            f"gpt_max_queue = {args.gpt_max_queue}\n"
+            f"flush_interval = {args.flush_interval}\n"
+            f"flush_threshold = {args.flush_threshold}\n"
+            "metrics_port = 0\n"
+        )
+
+
+def make_storage(args):
+    from utils import ticketstorage
+    if args.storage == "sqlite":
+        return ticketstorage.SQLiteTicketStorage()
+    return ticketstorage.JSONTicketStorage(snapshot_format=args.snapshot_format)
+
+
+async def generate_dataset(args, rng: random.Random) -> dict:
+    from utils import gptchatter, tickethandler
+
+    timings = {}
+    start = time.perf_counter()
+    # A long interval and huge threshold keep the write-behind buffer from flushing mid-generation.
+    handler = tickethandler.TicketHandler(storage=make_storage(args), flush_interval=3600, flush_threshold=10 ** 9)
+    chatter = gptchatter.GPTChatterDB("sk-benchmark", flush_interval=3600, flush_threshold=10 ** 9)
+    handler.flusher.start()
+    chatter.flusher.start()
+
+    for _ in range(args.tickets):
+        user_id = str(snowflake())
+        ticket = handler.create_ticket(
+            user_id=user_id,
+            channel_id=str(snowflake()),
+            subject="General Ticket Ticket",
+            reason="Generated for the benchmark",
+            ign_username=f"player{user_id[-6:]}",
+            category=rng.choice(CATEGORIES),
+        )
+        for i in range(args.logs_per_ticket):
+            author = user_id if i % 2 == 0 else "1240327290290700449"
+            handler.add_ticket_log_with_user(ticket.ticket_id, author, "bench", rng.choice(OWNER_MESSAGES))
+        if rng.random() >= args.open_ratio:
+            handler.close_ticket(ticket.ticket_id, "Closed by <@1240327290290700449>")
+            if rng.random() < 0.5:
+                handler.update_ticket(ticket.ticket_id, channel_id="deleted")
+        elif rng.random() < args.conversation_ratio:
+            chat = chatter.add_user(ticket.ticket_id)
+            for _ in range(args.logs_per_ticket // 2):
+                chat.messages.append({"role": "user", "content": rng.choice(OWNER_MESSAGES)})
+                chat.messages.append({"role": "assistant", "content": "Happy to help with that!"})
+            chatter.update_user(ticket.ticket_id)
+    timings["generate_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await handler.flusher.stop()
+    timings["ticket_flush_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    await chatter.flusher.stop()
+    timings["chatter_flush_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    handler.save()
+    timings["ticket_compact_seconds"] = time.perf_counter() - start
+    handler.storage.close()
+    return timings
+
+
+def measure_load(args, rng: random.Random) -> dict:
+    from utils import gptchatter, tickethandler
+
+    timings = {}
+    start = time.perf_counter()
+    handler = tickethandler.TicketHandler(storage=make_storage(args))
+    timings["ticket_load_seconds"] = time.perf_counter() - start
+
+    sample = rng.sample(list(handler.tickets), min(100, len(handler.tickets)))
+    start = time.perf_counter()
+    for ticket_id in sample:
+        handler.tickets[ticket_id].logs
+    timings["transcript_load_per_ticket_seconds"] = (time.perf_counter() - start) / max(1, len(sample))
+    handler.storage.close()
+
+    start = time.perf_counter()
+    chatter = gptchatter.GPTChatterDB("sk-benchmark")
+    timings["chatter_load_seconds"] = time.perf_counter() - start
+
+    sample = list(chatter.shard_keys)[:100]
+    start = time.perf_counter()
+    for user in sample:
+        chatter.get_user(user)
+    timings["conversation_load_per_ticket_seconds"] = (time.perf_counter() - start) / max(1, len(sample))
+    return timings
+
+
+class Workload:
+    def __init__(self, args, tickets, rng: random.Random):
+        self.args = args
+        self.tickets = tickets
+        self.handler = tickets.ticket_handler
+        self.rng = rng
+        self.api = FakeAPI(args.api_latency)
+        self.guild = FakeGuild(self.api)
+        self.panel = self.guild.channel(snowflake())
+        self.staff = FakeUser(1240327290290700449, "staff", roles=(1240327290290700449,))
+        self.recorder = Recorder()
+        self.ticket_ids = list(self.handler.tickets)
+        self.pending = set()
+
+    def _callback(self, name):
+        handler = getattr(self.tickets, name)
+        return getattr(handler, "callback", handler)
+
+    def _pick(self, predicate):
+        for _ in range(20):
+            ticket = self.handler.tickets.get(self.rng.choice(self.ticket_ids))
+            if ticket and predicate(ticket):
+                return ticket
+        return None
+
+    def _owner(self, ticket) -> FakeUser:
+        return FakeUser(int(ticket.user_id), f"player{ticket.user_id[-6:]}")
+
+    def _ticket_context(self, ticket, author) -> FakeContext:
+        return FakeContext(self.api, self.guild, author, channel=self.guild.channel(ticket.channel_id))
+
+    async def create(self):
+        author = FakeUser(snowflake(), "newplayer")
+        ctx = FakeContext(
+            self.api, self.guild, author, channel=self.panel, values=[self.rng.choice(CATEGORIES)],
+            responses={"ign": "NewPlayer", "reason": "I need help with my account"}, panel=self.panel,
+        )
+        before = len(self.handler.tickets)
+        await self.recorder.timed("handle_ticket_select", self._callback("handle_ticket_select")(ctx))
+        if len(self.handler.tickets) > before:
+            self.ticket_ids.append(max(self.handler.tickets, key=int))
+
+    async def message(self):
+        ticket = self._pick(lambda t: t.status == "open" and t.channel_id != "deleted")
+        if ticket is None:
+            return
+        channel = self.guild.channel(ticket.channel_id)
+        if self.rng.random() < self.args.staff_ratio:
+            msg = FakeMessage(self.api, channel, self.staff, self.rng.choice(STAFF_MESSAGES))
+        else:
+            msg = FakeMessage(self.api, channel, self._owner(ticket), self.rng.choice(OWNER_MESSAGES))
+        await self.recorder.timed("log_ticket_message", self._callback("log_ticket_message")(FakeMessageCreate(msg)))
+
+    async def close(self):
+        ticket = self._pick(lambda t: t.status == "open" and t.channel_id != "deleted")
+        if ticket is not None:
+            ctx = self._ticket_context(ticket, self.staff)
+            await self.recorder.timed("close_ticket_callback", self._callback("close_ticket_callback")(ctx))
+
+    async def reopen(self):
+        ticket = self._pick(lambda t: t.status == "closed" and t.channel_id != "deleted")
+        if ticket is not None:
+            ctx = self._ticket_context(ticket, self.staff)
+            await self.recorder.timed("reopen_ticket_callback", self._callback("reopen_ticket_callback")(ctx))
+
+    async def delete(self):
+        ticket = self._pick(lambda t: t.status == "closed" and t.channel_id != "deleted")
+        if ticket is not None:
+            ctx = self._ticket_context(ticket, self.staff)
+            await self.recorder.timed("delete_ticket_callback", self._callback("delete_ticket_callback")(ctx))
+
+    async def drive(self, operation, rate: float, deadline: float):
+        if rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.rng.expovariate(rate))
+            if loop.time() >= deadline:
+                return
+            task = asyncio.ensure_future(operation())
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+
+    async def run(self):
+        args = self.args
+        deadline = asyncio.get_running_loop().time() + args.duration
+        await asyncio.gather(
+            self.drive(self.create, args.create_rate, deadline),
+            self.drive(self.message, args.message_rate, deadline),
+            self.drive(self.close, args.close_rate, deadline),
+            self.drive(self.reopen, args.reopen_rate, deadline),
+            self.drive(self.delete, args.delete_rate, deadline),
+        )
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+
+
+async def wait_for_replies(tickets, timeout: float):
+    # Replies run outside the handlers (debounce timer, then the GPT scheduler); let them drain.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        coalescer, scheduler = tickets.coalescer, tickets.gpt_scheduler
+        if not (coalescer._timers or coalescer._inflight or scheduler.queue_depth or scheduler.running):
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def run_load(args, rng: random.Random) -> dict:
+    stub = StubOpenAI(args.openai_first_token, args.openai_token_latency)
+    base_url = await stub.start()
+
+    from openai import AsyncOpenAI, OpenAI
+    from commands import tickets
+    from utils.metrics import LoopLagMonitor
+
+    tickets.TICKET_COOLDOWN = timedelta(0)
+    tickets.chatter.client = OpenAI(api_key="sk-benchmark", base_url=base_url, max_retries=0)
+    tickets.chatter.async_client = AsyncOpenAI(api_key="sk-benchmark", base_url=base_url, max_retries=0)
+
+    workload = Workload(args, tickets, rng)
+    answer_ticket_messages = tickets.answer_ticket_messages
+
+    async def timed_answer(ticket_id, msg, content):
+        await workload.recorder.timed("answer_ticket_messages", answer_ticket_messages(ticket_id, msg, content))
+
+    # The coalescer resolves this name at dispatch time, so every GPT/FAQ reply is timed end to end.
+    tickets.answer_ticket_messages = timed_answer
+
+    await getattr(tickets.on_startup, "callback", tickets.on_startup)()
+    lag = LagSamples()
+    monitor = LoopLagMonitor(lag, args.lag_interval)
+    monitor.start()
+    start = time.perf_counter()
+    await workload.run()
+    drained = await wait_for_replies(tickets, timeout=args.drain_timeout)
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+
+    timings = {}
+    start = time.perf_counter()
+    await tickets.ticket_handler.flusher.stop()
+    timings["ticket_final_flush_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    await tickets.chatter.flusher.stop()
+    timings["chatter_final_flush_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    tickets.ticket_handler.save()
+    timings["ticket_compact_seconds"] = time.perf_counter() - start
+
+    await stub.stop()
+    return {
+        "elapsed_seconds": elapsed,
+        "replies_drained": drained,
+        "handlers": workload.recorder.report(),
+        "event_loop_lag": percentiles(lag),
+        "storage": timings,
+        "scheduler": tickets.gpt_scheduler.stats(),
+        "faq": tickets.faq_matcher.stats(),
+        "discord_api_calls": workload.api.calls,
+        "openai_requests": stub.requests,
+        "openai_prompt_tokens": stub.prompt_tokens,
+        "metrics": tickets.metrics.registry.render(),
+        "tickets_after_run": len(tickets.ticket_handler.tickets),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    output = os.path.abspath(args.output)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ticket-bench-")
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    for name in ("faq.json", "roleslist.json"):
+        src = os.path.join(REPO_ROOT, "data", name)
+        if os.path.exists(src):
+            shutil.copy(src, os.path.join(workdir, "data", name))
+    write_config(workdir, args)
+    # utils.config resolves ~ when it is imported, so HOME must point at the scratch config first.
+    os.environ["HOME"] = workdir
+    os.chdir(workdir)
+
+    # Without the resource module there is no peak RSS to report, so the Python heap peak stands in.
+    trace = args.tracemalloc or resource is None
+    if trace:
+        tracemalloc.start()
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+    }
+    try:
+        results["dataset"] = asyncio.run(generate_dataset(args, rng))
+        results["load"] = measure_load(args, rng)
+        results["run"] = asyncio.run(run_load(args, rng))
+        results["memory"] = {}
+        if resource is not None:
+            results["memory"]["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if trace:
+            results["memory"]["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps({name: stats["p95"] for name, stats in results["run"]["handlers"].items()}, indent=4))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,23 @@
+import asyncio
+import contextlib
 from interactions import listen
 from bot_instance import bot
 import os
 for i in os.listdir("commands"):
     if i.endswith(".py"):
         exec(f"from commands.{i.replace('.py', '')} import *")
+from commands.tickets import on_shutdown
 
 @listen()
 async def on_ready():
     print("Your bot has started.")
 
+async def main():
+    try:
+        await bot.astart()
+    finally:
+        await on_shutdown()
+
 # Start the bot
-bot.start()
+with contextlib.suppress(KeyboardInterrupt):
+    asyncio.run(main())
@@ -1,23 +1,27 @@
 import interactions
-import json
-from utils import config, tickethandler
+from utils import config, roles, tickethandler, ticketstorage
 from interactions import Client, check, SlashContext
 
-ticket_handler = tickethandler.TicketHandler()
 AppConfig_obj = config.AppConfig()
+ticket_handler = tickethandler.TicketHandler(
+    storage=ticketstorage.SQLiteTicketStorage() if AppConfig_obj.get_ticket_storage() == "sqlite"
+    else ticketstorage.JSONTicketStorage(snapshot_format=AppConfig_obj.get_snapshot_format()),
+    flush_interval=AppConfig_obj.get_flush_interval(),
+    flush_threshold=AppConfig_obj.get_flush_threshold(),
+)
 token = AppConfig_obj.get_bot_key()
 bot = Client(token=token, sync_interactions=True, intents=interactions.Intents.DEFAULT | interactions.Intents.MESSAGE_CONTENT)
 
+role_registry = roles.RoleRegistry()
+
 def staff_role_check(exclude: list = [], exclude_acts_as_include: bool = False):
     async def predicate(ctx: SlashContext):
-        with open('data/roleslist.json') as f:
-            roles_dict = json.load(f)
-        check_roles = []
-        for role, (a, b) in roles_dict.items():
-            if not exclude_acts_as_include and role in exclude:
-                continue
-            check_roles.extend((a, b))
-        user_roles = [int(i.id) for i in ctx.author.roles]
-        return any(role_id in user_roles for role_id in check_roles)
+        return role_registry.is_staff((int(i.id) for i in ctx.author.roles), exclude, exclude_acts_as_include)
+
+    return check(predicate)
+
+def staff_rank_check(rank: str):
+    async def predicate(ctx: SlashContext):
+        return role_registry.is_at_least((int(i.id) for i in ctx.author.roles), rank)
 
-    return check(predicate)
\ No newline at end of file
+    return check(predicate)
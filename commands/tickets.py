@@ -1,5 +1,8 @@
+import asyncio
 import atexit
-from datetime import datetime, timezone, timedelta
+import re
+import time
+from datetime import timedelta
 
 from interactions import (
     slash_command,
@@ -13,25 +16,114 @@ from interactions import (
     ActionRow,
     component_callback,
     ComponentContext,
-    PermissionOverwrite,
-    Permissions,
     Modal,
     ShortText,
-    ParagraphText
+    ParagraphText,
+    listen
 )
-from bot_instance import bot, ticket_handler, AppConfig_obj
-from utils import colors, gptchatter
+from bot_instance import bot, ticket_handler, AppConfig_obj, staff_role_check
+from utils import colors, gptchatter, metrics
+from utils.coalescer import MessageCoalescer
+from utils.flusher import FLUSH_SECONDS
+from utils.gptfunctions import MCSRVSTAT_LOOKUPS, status_client
+from utils.gptscheduler import GPTScheduler, SchedulerSaturated
+from utils.tasks import spawn
+from utils.tickethandler import LOG_ATTACHMENT, LOG_MESSAGE, LOG_SYSTEM
+from utils.ticketlifecycle import TicketLifecycle
+from utils.transcriptexport import TranscriptExporter
 
 
 TICKET_COOLDOWN = timedelta(seconds=30)
+ARCHIVE_CHECK_INTERVAL = 3600
+# Discord allows roughly five message edits per five seconds per channel.
+STREAM_EDIT_INTERVAL = 1.2
 SUPPORT_ROLE_MENTION = "<@&1282491372250857676>"
+ROLE_MENTION = re.compile(r"<@&\d+>")
+# A mention the stream has only got partway through, e.g. "<@" or "<@&12824".
+PARTIAL_MENTION = re.compile(r"<(@(&|!)?\d*)?$")
 
-atexit.register(ticket_handler.save)
+atexit.register(ticket_handler.flush)
 
-chatter = gptchatter.GPTChatterDB(AppConfig_obj.get_openai_key())
-atexit.register(chatter.save)
+gpt_scheduler = GPTScheduler(
+    max_concurrency=AppConfig_obj.get_gpt_max_concurrency(),
+    requests_per_minute=AppConfig_obj.get_gpt_requests_per_minute(),
+    tokens_per_minute=AppConfig_obj.get_gpt_tokens_per_minute(),
+    max_queue=AppConfig_obj.get_gpt_max_queue(),
+)
+
+chatter = gptchatter.GPTChatterDB(
+    AppConfig_obj.get_openai_key(),
+    flush_interval=AppConfig_obj.get_flush_interval(),
+    flush_threshold=AppConfig_obj.get_flush_threshold(),
+    timeout=AppConfig_obj.get_openai_timeout(),
+    max_retries=AppConfig_obj.get_openai_max_retries(),
+    context_budget=AppConfig_obj.get_openai_context_budget(),
+    limiter=gpt_scheduler,
+)
+atexit.register(chatter.flush)
+
+faq_matcher = gptchatter.FAQMatcher()
+
+coalescer = MessageCoalescer(
+    lambda ticket_id, msg, content: answer_ticket_messages(ticket_id, msg, content),
+    window=AppConfig_obj.get_gpt_debounce_seconds(),
+)
+
+transcript_exporter = TranscriptExporter(
+    ticket_handler.storage.iter_logs,
+    max_workers=AppConfig_obj.get_transcript_export_workers(),
+)
 
 SUPPORT_ROLE_ID = 123456789012345678
+ticket_lifecycle = TicketLifecycle(SUPPORT_ROLE_ID)
+
+loop_lag_monitor = metrics.LoopLagMonitor()
+metrics_server = metrics.MetricsServer(host=AppConfig_obj.get_metrics_host(), port=AppConfig_obj.get_metrics_port())
+metrics.registry.gauge("bot_open_tickets", "Tickets currently open.",
+                       lambda: sum(len(ids) for ids in ticket_handler.open_by_user_id.values()))
+metrics.registry.gauge("bot_gpt_queue_depth", "GPT replies waiting for the scheduler.", lambda: gpt_scheduler.queue_depth)
+metrics.registry.gauge("bot_gpt_running", "GPT replies currently being generated.", lambda: gpt_scheduler.running)
+
+# Long-running loops started at startup; on_shutdown cancels them.
+background_tasks = set()
+
+
+@listen()
+async def on_startup():
+    ticket_handler.flusher.start()
+    chatter.flusher.start()
+    loop_lag_monitor.start()
+    transcript_exporter.resume()
+    try:
+        await metrics_server.start()
+    except OSError as e:
+        print("Error starting metrics server:", e)
+    if AppConfig_obj.get_archive_after_days() > 0:
+        spawn(archive_loop(), background_tasks, "Error in archive loop:")
+
+
+async def on_shutdown():
+    # Run by bot.py once the gateway connection has stopped, while the event loop is still up. The
+    # ticket and conversation flushes are left to atexit, which also covers scripts; background loops are
+    # stopped first so none of them is still writing when those run.
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    loop_lag_monitor.stop()
+    await metrics_server.stop()
+    await status_client.close()
+
+
+async def archive_loop():
+    older_than = timedelta(days=AppConfig_obj.get_archive_after_days())
+    while True:
+        try:
+            archived = await ticket_handler.archive_old_tickets(older_than)
+            if archived:
+                print(f"Archived {archived} ticket(s).")
+        except Exception as e:
+            print("Error archiving tickets:", e)
+        await asyncio.sleep(ARCHIVE_CHECK_INTERVAL)
 
 
 @slash_command(name="create_panel", description="Create a panel!")
@@ -41,6 +133,7 @@ SUPPORT_ROLE_ID = 123456789012345678
     required=True,
     opt_type=OptionType.CHANNEL
 )
+@metrics.timed_handler
 async def create_panel(ctx: SlashContext, channel):
     await ctx.send("Panel created!", ephemeral=True)
 
@@ -80,6 +173,7 @@ async def create_panel(ctx: SlashContext, channel):
 
 
 @component_callback("ticket_select_menu")
+@metrics.timed_handler
 async def handle_ticket_select(ctx: ComponentContext):
     ticket_category = ctx.values[0]
 
@@ -107,19 +201,19 @@ async def handle_ticket_select(ctx: ComponentContext):
         await ctx.message.edit(components=[reset_dropdown])
         return
 
-    ticket_id = ticket_handler._generate_ticket_id()
-    overwrites = [
-        PermissionOverwrite(id=ctx.guild_id, type=0, deny=Permissions.VIEW_CHANNEL),
-        PermissionOverwrite(id=ctx.author.id, type=1, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES),
-        PermissionOverwrite(id=SUPPORT_ROLE_ID, type=0, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES)
-    ]
+    ticket_id = ticket_handler.reserve_ticket_id()
+    overwrites = ticket_lifecycle.overwrites(ctx.guild_id, ctx.author.id, "open")
     category_id = 1353874386716725359
-    new_channel = await ctx.guild.create_text_channel(
-        name=f"ticket-{ticket_id}",
-        category=category_id,
-        permission_overwrites=overwrites,
-        rate_limit_per_user=5
-    )
+    try:
+        new_channel = await ctx.guild.create_text_channel(
+            name=ticket_lifecycle.channel_name(ticket_id, "open"),
+            category=category_id,
+            permission_overwrites=overwrites,
+            rate_limit_per_user=5
+        )
+    except Exception:
+        ticket_handler.release_ticket_id(ticket_id)
+        raise
 
     subject = f"{ticket_category} Ticket"
     ticket = ticket_handler.create_ticket(
@@ -128,7 +222,8 @@ async def handle_ticket_select(ctx: ComponentContext):
         subject=subject,
         reason=reason_input,
         ign_username=ign,
-        category=ticket_category
+        category=ticket_category,
+        ticket_id=ticket_id
     )
     chatter.add_user(ticket.ticket_id)
 
@@ -165,37 +260,34 @@ async def handle_ticket_select(ctx: ComponentContext):
     await ctx.message.edit(components=[new_dropdown])
 
 
-@component_callback("close_ticket")
-async def close_ticket_callback(ctx: ComponentContext):
-    await ctx.defer(ephemeral=True)
-    ticket = next((t for t in ticket_handler.tickets.values() if t.channel_id == str(ctx.channel.id)), None)
-    if not ticket:
-        await ctx.send("Ticket not found.", ephemeral=True)
+def cooldown_minutes(since_ts: float) -> int:
+    # Whole minutes left of TICKET_COOLDOWN after `since_ts`, or 0 once it has passed.
+    if not since_ts:
+        return 0
+    remaining = since_ts + TICKET_COOLDOWN.total_seconds() - time.time()
+    return int(remaining // 60) + 1 if remaining > 0 else 0
+
+
+async def ticket_for_channel(channel):
+    # Channels not named like a closed ticket are answered without going to the archive index.
+    return await ticket_handler.aget_by_channel(
+        str(channel.id), check_archive=TicketLifecycle.may_be_closed_ticket(channel)
+    )
+
+
+async def close_ticket_in_channel(ctx, ticket):
+    minutes = cooldown_minutes(ticket.last_reopened_ts)
+    if minutes:
+        await ctx.send(f"You cannot close this ticket so soon. Please wait {minutes} minute(s).", ephemeral=True)
         return
-    now = datetime.now(timezone.utc)
-    if ticket.last_reopened_at:
-        last_reopen = datetime.fromisoformat(ticket.last_reopened_at)
-        if now - last_reopen < TICKET_COOLDOWN:
-            remaining = TICKET_COOLDOWN - (now - last_reopen)
-            minutes = int(remaining.total_seconds() // 60) + 1
-            await ctx.send(f"You cannot close this ticket so soon. Please wait {minutes} minute(s).", ephemeral=True)
-            return
     if ticket.status == "closed":
         await ctx.send("This ticket is already closed.", ephemeral=True)
         return
 
     ticket_handler.close_ticket(ticket.ticket_id, f"Closed by <@{ctx.author.id}>")
-    await ctx.channel.edit(name=f"closed-{ticket.ticket_id}")
-
-    new_overwrites = [
-        PermissionOverwrite(id=ctx.guild_id, type=0, deny=Permissions.VIEW_CHANNEL),
-        PermissionOverwrite(id=ticket.user_id, type=1, allow=Permissions.VIEW_CHANNEL, deny=Permissions.SEND_MESSAGES),
-        PermissionOverwrite(id=SUPPORT_ROLE_ID, type=0, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES)
-    ]
-    try:
-        await ctx.channel.edit(permission_overwrites=new_overwrites)
-    except Exception as e:
-        print("Error updating permissions:", e)
+    coalescer.discard(ticket.ticket_id)
+    transcript_exporter.export(ticket, "closed")
+    await ticket_lifecycle.apply(ctx.channel, ticket, ctx.guild_id)
 
     reopen_button = Button(custom_id="reopen_ticket", label="Reopen Ticket", style=ButtonStyle.PRIMARY, emoji="🔓")
     delete_button = Button(custom_id="delete_ticket", label="Delete Ticket", style=ButtonStyle.DANGER, emoji="🗑️")
@@ -212,21 +304,29 @@ async def close_ticket_callback(ctx: ComponentContext):
         chatter.delete_user(ticket.ticket_id)
 
 
+@component_callback("close_ticket")
+@metrics.timed_handler
+async def close_ticket_callback(ctx: ComponentContext):
+    await ctx.defer(ephemeral=True)
+    ticket = await ticket_for_channel(ctx.channel)
+    if not ticket:
+        await ctx.send("Ticket not found.", ephemeral=True)
+        return
+    await close_ticket_in_channel(ctx, ticket)
+
+
 @component_callback("reopen_ticket")
+@metrics.timed_handler
 async def reopen_ticket_callback(ctx: ComponentContext):
     await ctx.defer(ephemeral=True)
-    ticket = next((t for t in ticket_handler.tickets.values() if t.channel_id == str(ctx.channel.id)), None)
+    ticket = await ticket_for_channel(ctx.channel)
     if not ticket:
         await ctx.send("Ticket not found.", ephemeral=True)
         return
-    now = datetime.now(timezone.utc)
-    if ticket.last_closed_at:
-        last_close = datetime.fromisoformat(ticket.last_closed_at)
-        if now - last_close < TICKET_COOLDOWN:
-            remaining = TICKET_COOLDOWN - (now - last_close)
-            minutes = int(remaining.total_seconds() // 60) + 1
-            await ctx.send(f"You cannot reopen this ticket so soon. Please wait {minutes} minute(s).", ephemeral=True)
-            return
+    minutes = cooldown_minutes(ticket.last_closed_ts)
+    if minutes:
+        await ctx.send(f"You cannot reopen this ticket so soon. Please wait {minutes} minute(s).", ephemeral=True)
+        return
     if ticket.status != "closed":
         await ctx.send("This ticket is not closed.", ephemeral=True)
         return
@@ -236,19 +336,10 @@ async def reopen_ticket_callback(ctx: ComponentContext):
         ticket.ticket_id,
         str(ctx.author.id),
         ctx.author.username,
-        "Ticket reopened."
+        "Ticket reopened.",
+        entry_type=LOG_SYSTEM,
     )
-    await ctx.channel.edit(name=f"ticket-{ticket.ticket_id}")
-
-    new_overwrites = [
-        PermissionOverwrite(id=ctx.guild_id, type=0, deny=Permissions.VIEW_CHANNEL),
-        PermissionOverwrite(id=ticket.user_id, type=1, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES),
-        PermissionOverwrite(id=SUPPORT_ROLE_ID, type=0, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES)
-    ]
-    try:
-        await ctx.channel.edit(permission_overwrites=new_overwrites)
-    except Exception as e:
-        print("Error updating permissions on reopen:", e)
+    await ticket_lifecycle.apply(ctx.channel, ticket, ctx.guild_id)
 
     close_button = Button(custom_id="close_ticket", label="Close Ticket", style=ButtonStyle.PRIMARY, emoji="🔒")
     delete_button = Button(custom_id="delete_ticket", label="Delete Ticket", style=ButtonStyle.DANGER, emoji="🗑️")
@@ -263,9 +354,10 @@ async def reopen_ticket_callback(ctx: ComponentContext):
 
 
 @component_callback("delete_ticket")
+@metrics.timed_handler
 async def delete_ticket_callback(ctx: ComponentContext):
     await ctx.defer(ephemeral=True)
-    ticket = next((t for t in ticket_handler.tickets.values() if t.channel_id == str(ctx.channel.id)), None)
+    ticket = await ticket_for_channel(ctx.channel)
     if not ticket:
         await ctx.send("Ticket not found.", ephemeral=True)
         return
@@ -277,16 +369,29 @@ async def delete_ticket_callback(ctx: ComponentContext):
         ticket.ticket_id,
         str(ctx.author.id),
         ctx.author.username,
-        "Ticket channel deleted."
+        "Ticket channel deleted.",
+        entry_type=LOG_SYSTEM,
     )
     ticket_handler.update_ticket(ticket.ticket_id, channel_id="deleted")
+    transcript_exporter.export(ticket, "deleted")
+    ticket_lifecycle.forget(ctx.channel.id)
+    coalescer.discard(ticket.ticket_id)
     await ctx.channel.delete()
 
 
 @bot.listen("on_message_create")
+@metrics.timed_handler
 async def log_ticket_message(event):
     msg = event.message
+    author = getattr(msg, "author", None) or msg.member
+    if not author or getattr(author, "bot", False):
+        return
+    ticket = await ticket_for_channel(msg.channel)
+    if not ticket:
+        return
+
     content = ""
+    entry_type = LOG_MESSAGE
     if hasattr(msg, "content") and msg.content:
         content = msg.content
     elif hasattr(msg, "data") and msg.data.get("content"):
@@ -295,51 +400,109 @@ async def log_ticket_message(event):
         if hasattr(msg, "attachments") and msg.attachments:
             attachment_urls = ", ".join(att.url for att in msg.attachments)
             content = f"[Attachment(s): {attachment_urls}]"
+            entry_type = LOG_ATTACHMENT
         else:
             content = "[No message content]"
 
-    author = getattr(msg, "author", None) or msg.member
-    if not author or getattr(author, "bot", False):
+    ticket_handler.add_ticket_log_with_user(
+        ticket.ticket_id,
+        str(author.id),
+        author.username,
+        content,
+        message_id=str(msg.id),
+        entry_type=entry_type,
+    )
+    if ticket.user_id == str(author.id) and ticket.status == "open":
+        coalescer.submit(ticket.ticket_id, msg, content)
+
+
+@metrics.timed_handler
+async def answer_ticket_messages(ticket_id, msg, content):
+    ticket = ticket_handler.tickets.get(ticket_id)
+    if not ticket or ticket.status != "open":
+        return
+    chat_obj = chatter.get_user(ticket.ticket_id)
+    if not chat_obj:
+        chat_obj = chatter.add_user(ticket.ticket_id)
+
+    if chat_obj.staff_ping_used:
         return
 
-    for ticket in ticket_handler.tickets.values():
-        if ticket.channel_id == str(msg.channel.id):
-            ticket_handler.add_ticket_log_with_user(
-                ticket.ticket_id,
-                str(author.id),
-                author.username,
-                content
-            )
-            if ticket.user_id == str(author.id) and ticket.status == "open":
-                chat_obj = chatter.get_user(ticket.ticket_id)
-                if not chat_obj:
-                    chat_obj = chatter.add_user(ticket.ticket_id)
-
-                if not chat_obj.staff_ping_used:
-                    await msg.channel.trigger_typing()
-                    answer = chat_obj.chat_with_gpt(content)
-                    chatter.update_user(ticket.ticket_id)
-                    if answer:
-                        try:
-                            talk_button = Button(
-                                custom_id="talk_to_human",
-                                label="Talk to a Human",
-                                style=ButtonStyle.SECONDARY
-                            )
-                            action_row = ActionRow(talk_button)
-                            await msg.reply(answer, components=[action_row])
-                        except Exception as e:
-                            print("Error sending GPT reply:", e)
-            break
+    canned = faq_matcher.match(content)
+    if canned:
+        chat_obj.record_canned_reply(content, canned)
+        chatter.update_user(ticket.ticket_id)
+        await msg.reply(canned, components=[ActionRow(talk_to_human_button())])
+        return
+
+    await msg.channel.trigger_typing()
+    estimated_tokens = chat_obj.estimate_request_tokens(content)
+    try:
+        # First replies jump ahead of long-running conversations.
+        await gpt_scheduler.submit(
+            ticket.ticket_id,
+            lambda: send_streamed_reply(msg, chat_obj, content, estimated_tokens),
+            priority=chat_obj.reply_turns,
+            estimated_tokens=estimated_tokens,
+        )
+    except SchedulerSaturated:
+        await msg.reply(
+            "Our assistant is handling a lot of tickets right now. "
+            "Press **Talk to a Human** below and a staff member will help you.",
+            components=[ActionRow(talk_to_human_button())]
+        )
+    except Exception as e:
+        print("Error sending GPT reply:", e)
+    chatter.update_user(ticket.ticket_id)
+
+
+def talk_to_human_button():
+    return Button(
+        custom_id="talk_to_human",
+        label="Talk to a Human",
+        style=ButtonStyle.SECONDARY
+    )
+
+
+async def send_streamed_reply(msg, chat_obj, content, prepaid_tokens=0):
+    loop = asyncio.get_running_loop()
+    reply = None
+    first_text = ""
+    text = ""
+    last_edit = 0.0
+    async for piece in chat_obj.astream_chat_with_gpt(content, prepaid_tokens):
+        text += piece
+        # Never show half a mention; the first message in particular has to carry a whole one.
+        if not text.strip() or PARTIAL_MENTION.search(text):
+            continue
+        if reply is None:
+            reply = await msg.reply(text)
+            first_text = text
+            last_edit = loop.time()
+        elif loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+            await reply.edit(content=text)
+            last_edit = loop.time()
+
+    if not text.strip():
+        return
+    action_row = ActionRow(talk_to_human_button())
+    if reply is None:
+        await msg.reply(text, components=[action_row])
+        return
+    await reply.edit(content=text, components=[action_row])
+    # Discord doesn't notify mentions that are edited into a message, so an escalation the model wrote
+    # after the first chunk gets a message of its own.
+    sent_mentions = set(ROLE_MENTION.findall(first_text))
+    new_mentions = [mention for mention in dict.fromkeys(ROLE_MENTION.findall(text)) if mention not in sent_mentions]
+    if new_mentions:
+        await msg.channel.send(" ".join(new_mentions))
 
 @component_callback("talk_to_human")
+@metrics.timed_handler
 async def talk_to_human_callback(ctx: ComponentContext):
     await ctx.defer(ephemeral=True)
 
-    ticket = next(
-        (t for t in ticket_handler.tickets.values() if t.channel_id == str(ctx.channel.id)),
-        None
-    )
+    ticket = await ticket_for_channel(ctx.channel)
     if not ticket:
         await ctx.send("Ticket not found.", ephemeral=True)
         return
@@ -357,47 +520,77 @@ async def talk_to_human_callback(ctx: ComponentContext):
         await ctx.send("You’ve already requested a human. Please wait for staff to join you.", ephemeral=True)
 
 @slash_command(name="close", description="Close the current ticket")
+@metrics.timed_handler
 async def close_ticket_command(ctx: SlashContext):
     await ctx.defer(ephemeral=True)
-    ticket = next((t for t in ticket_handler.tickets.values() if t.channel_id == str(ctx.channel_id)), None)
+    ticket = await ticket_for_channel(ctx.channel)
     if not ticket:
         await ctx.send("Ticket not found in this channel.", ephemeral=True)
         return
-    now = datetime.now(timezone.utc)
-    if ticket.last_reopened_at:
-        last_reopen = datetime.fromisoformat(ticket.last_reopened_at)
-        if now - last_reopen < TICKET_COOLDOWN:
-            remaining = TICKET_COOLDOWN - (now - last_reopen)
-            minutes = int(remaining.total_seconds() // 60) + 1
-            await ctx.send(f"You cannot close this ticket so soon. Please wait {minutes} minute(s).", ephemeral=True)
-            return
-    if ticket.status == "closed":
-        await ctx.send("This ticket is already closed.", ephemeral=True)
-        return
+    await close_ticket_in_channel(ctx, ticket)
+
+
+def format_ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} ms" if seconds >= 0.01 else f"{seconds * 1000:.1f} ms"
+
+
+@slash_command(name="botstats", description="Show bot latency and usage statistics")
+@staff_role_check()
+@metrics.timed_handler
+async def botstats_command(ctx: SlashContext):
+    handler_lines = []
+    handlers = sorted({labels["handler"] for labels in metrics.HANDLER_SECONDS.keys()})
+    for name in handlers:
+        ok = metrics.HANDLER_SECONDS.count(handler=name, outcome="ok")
+        errors = metrics.HANDLER_SECONDS.count(handler=name, outcome="error")
+        handler_lines.append(
+            f"`{name}`: {ok + errors} calls, p50 {format_ms(metrics.HANDLER_SECONDS.quantile(0.5, handler=name, outcome='ok'))}, "
+            f"p95 {format_ms(metrics.HANDLER_SECONDS.quantile(0.95, handler=name, outcome='ok'))}"
+            + (f", {errors} errors" if errors else "")
+        )
 
-    ticket_handler.close_ticket(ticket.ticket_id, f"Closed by <@{ctx.author.id}>")
-    await ctx.channel.edit(name=f"closed-{ticket.ticket_id}")
+    storage_lines = [
+        f"`{labels['store']}`: {FLUSH_SECONDS.count(**labels)} flushes, "
+        f"p95 {format_ms(FLUSH_SECONDS.quantile(0.95, **labels))}"
+        for labels in FLUSH_SECONDS.keys()
+    ]
 
-    new_overwrites = [
-        PermissionOverwrite(id=ctx.guild_id, type=0, deny=Permissions.VIEW_CHANNEL),
-        PermissionOverwrite(id=ticket.user_id, type=1, allow=Permissions.VIEW_CHANNEL, deny=Permissions.SEND_MESSAGES),
-        PermissionOverwrite(id=SUPPORT_ROLE_ID, type=0, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES)
+    openai_lines = [
+        f"`{labels['mode']}/{labels['outcome']}`: {gptchatter.OPENAI_SECONDS.count(**labels)} requests, "
+        f"p95 {format_ms(gptchatter.OPENAI_SECONDS.quantile(0.95, **labels))}"
+        for labels in gptchatter.OPENAI_SECONDS.keys()
     ]
-    try:
-        await ctx.channel.edit(permission_overwrites=new_overwrites)
-    except Exception as e:
-        print("Error updating permissions:", e)
+    openai_lines.append(
+        f"Tokens: {gptchatter.OPENAI_TOKENS.get(kind='prompt'):.0f} prompt, "
+        f"{gptchatter.OPENAI_TOKENS.get(kind='completion'):.0f} completion; "
+        f"{gptchatter.OPENAI_RETRIES.total():.0f} retries"
+    )
 
-    reopen_button = Button(custom_id="reopen_ticket", label="Reopen Ticket", style=ButtonStyle.PRIMARY, emoji="🔓")
-    delete_button = Button(custom_id="delete_ticket", label="Delete Ticket", style=ButtonStyle.DANGER, emoji="🗑️")
-    action_row = ActionRow(reopen_button, delete_button)
-    close_embed = Embed(
-        title="Ticket Closed",
-        description="This ticket has been closed. To reopen it, click the unlock button below.",
-        color=0xFF0000
+    scheduler = gpt_scheduler.stats()
+    faq = faq_matcher.stats()
+    lag = metrics.EVENT_LOOP_LAG_SECONDS
+    embed = Embed(title="Bot Stats", color=colors.DiscordColors.BLUE)
+    embed.add_field(name="Handlers", value="\n".join(handler_lines) or "No calls yet.", inline=False)
+    embed.add_field(name="Storage", value="\n".join(storage_lines) or "No flushes yet.", inline=False)
+    embed.add_field(name="OpenAI", value="\n".join(openai_lines), inline=False)
+    embed.add_field(
+        name="GPT Scheduler",
+        value=(
+            f"{scheduler['queue_depth']} queued, {scheduler['running']} running, {scheduler['shed']} shed\n"
+            f"Wait p50 {format_ms(scheduler['wait_p50'])}, p95 {format_ms(scheduler['wait_p95'])}\n"
+            f"FAQ answered {faq['hits']}/{faq['checked']} ({faq['hit_rate']:.0%})"
+        ),
+        inline=False
     )
-    await ctx.channel.send(embed=close_embed, components=[action_row])
-    await ctx.send("Ticket closed successfully.", ephemeral=True)
-    chat_obj = chatter.get_user(ticket.ticket_id)
-    if chat_obj and not chat_obj.staff_ping_used:
-        chatter.delete_user(ticket.ticket_id)
\ No newline at end of file
+    embed.add_field(
+        name="Server Status API",
+        value=", ".join(f"{key[0]}: {value:.0f}" for key, value in sorted(MCSRVSTAT_LOOKUPS.values.items()))
+        or "No lookups yet.",
+        inline=False
+    )
+    embed.add_field(
+        name="Event Loop Lag",
+        value=f"p50 {format_ms(lag.quantile(0.5))}, p99 {format_ms(lag.quantile(0.99))}",
+        inline=False
+    )
+    await ctx.send(embed=embed, ephemeral=True)
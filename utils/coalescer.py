@@ -0,0 +1,52 @@
+import asyncio
+
+from utils.tasks import spawn
+
+
+class MessageCoalescer:
+    # Batches bursts of messages per key. A batch is dispatched once no new message has arrived for
+    # `window` seconds; anything that arrives while that key's dispatch is still running is held and
+    # sent as the next batch. dispatch(key, last_message, merged_text) is awaited for each batch.
+    def __init__(self, dispatch, window: float = 2.0):
+        self.dispatch = dispatch
+        self.window = window
+        self._buffers = {}
+        self._timers = {}
+        self._inflight = set()
+        self._tasks = set()
+
+    def submit(self, key, message, text: str):
+        self._buffers.setdefault(key, []).append((message, text))
+        if key not in self._inflight:
+            self._schedule(key)
+
+    def _schedule(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._fire, key)
+
+    def _fire(self, key):
+        self._timers.pop(key, None)
+        spawn(self._run(key), self._tasks, "Error answering ticket messages:")
+
+    async def _run(self, key):
+        burst = self._buffers.pop(key, None)
+        if not burst:
+            return
+        self._inflight.add(key)
+        try:
+            await self.dispatch(key, burst[-1][0], "\n".join(text for _, text in burst))
+        except Exception as e:
+            print("Error answering ticket messages:", e)
+        finally:
+            self._inflight.discard(key)
+            if self._buffers.get(key):
+                self._schedule(key)
+
+    def discard(self, key):
+        # For tickets that were closed or deleted; a dispatch already running is left to finish.
+        self._buffers.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
@@ -25,6 +25,54 @@ class AppConfig:
         openai_section = self.config['main']
         return openai_section['openai_key']
 
+    def get_openai_timeout(self):
+        return self.config.getfloat('main', 'openai_timeout', fallback=30.0)
+
+    def get_openai_max_retries(self):
+        return self.config.getint('main', 'openai_max_retries', fallback=3)
+
+    def get_openai_context_budget(self):
+        return self.config.getint('main', 'openai_context_budget', fallback=6000)
+
+    def get_gpt_debounce_seconds(self):
+        return self.config.getfloat('main', 'gpt_debounce_seconds', fallback=2.0)
+
+    def get_gpt_max_concurrency(self):
+        return self.config.getint('main', 'gpt_max_concurrency', fallback=4)
+
+    def get_gpt_requests_per_minute(self):
+        return self.config.getint('main', 'gpt_requests_per_minute', fallback=500)
+
+    def get_gpt_tokens_per_minute(self):
+        return self.config.getint('main', 'gpt_tokens_per_minute', fallback=30000)
+
+    def get_gpt_max_queue(self):
+        return self.config.getint('main', 'gpt_max_queue', fallback=50)
+
+    def get_ticket_storage(self):
+        return self.config.get('main', 'ticket_storage', fallback='json')
+
+    def get_snapshot_format(self):
+        return self.config.get('main', 'snapshot_format', fallback='json')
+
+    def get_flush_interval(self):
+        return self.config.getfloat('main', 'flush_interval', fallback=5.0)
+
+    def get_flush_threshold(self):
+        return self.config.getint('main', 'flush_threshold', fallback=50)
+
+    def get_archive_after_days(self):
+        return self.config.getfloat('main', 'archive_after_days', fallback=30.0)
+
+    def get_transcript_export_workers(self):
+        return self.config.getint('main', 'transcript_export_workers', fallback=2)
+
+    def get_metrics_host(self):
+        return self.config.get('main', 'metrics_host', fallback='127.0.0.1')
+
+    def get_metrics_port(self):
+        return self.config.getint('main', 'metrics_port', fallback=9464)
+
     def get_config_dir(self):
         return self.cfg_dir
 
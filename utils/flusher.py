@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+
+from utils.metrics import registry
+
+FLUSH_SECONDS = registry.histogram("bot_flush_seconds", "Time to write buffered changes to disk.", ("store",))
+FLUSHED_CHANGES = registry.counter("bot_flushed_changes_total", "Changes written by flushes.", ("store",))
+
+
+def atomic_write_json(path: str, data, indent=None):
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def read_jsonl(lines, marker=None):
+    # Yields the records of an append-only JSON Lines file (or a gzip stream of them), stopping at the
+    # first line or compressed member a crash tore mid-append; everything before it is intact. Lines
+    # without `marker` in them are skipped unparsed.
+    try:
+        for line in lines:
+            if marker is not None and marker not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                return
+            yield record
+    except (EOFError, gzip.BadGzipFile):
+        return
+
+
+class FlushScheduler:
+    # prepare_flush runs on the event loop and must snapshot whatever state it needs; the callable it
+    # returns does the blocking file I/O and runs in the default executor. A job that fails must leave
+    # its batch where the next prepare_flush will pick it up again; the changes stay counted as dirty
+    # so the next tick retries them.
+    def __init__(self, prepare_flush, interval: float = 5.0, threshold: int = 50, name: str = "default"):
+        self.prepare_flush = prepare_flush
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.dirty = 0
+        self._task = None
+        self._wake = None
+        self._lock = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def mark_dirty(self, count: int = 1):
+        self.dirty += count
+        if not self.running:
+            # Nothing will come back for it later (scripts, shutdown), so write through.
+            self.flush()
+        elif self.dirty >= self.threshold:
+            self._wake.set()
+
+    def start(self):
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush_async()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.dirty:
+                try:
+                    await self.flush_async()
+                except Exception as e:
+                    print("Error flushing to disk:", e)
+
+    async def flush_async(self):
+        if self._lock is None:
+            self.flush()
+            return
+        async with self._lock:
+            start = time.perf_counter()
+            dirty, self.dirty = self.dirty, 0
+            job = self.prepare_flush()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, job)
+            except Exception:
+                self.dirty += max(dirty, 1)
+                raise
+            FLUSHED_CHANGES.inc(dirty, store=self.name)
+            FLUSH_SECONDS.observe(time.perf_counter() - start, store=self.name)
+
+    def flush(self):
+        start = time.perf_counter()
+        dirty, self.dirty = self.dirty, 0
+        try:
+            self.prepare_flush()()
+        except Exception:
+            self.dirty += max(dirty, 1)
+            raise
+        FLUSHED_CHANGES.inc(dirty, store=self.name)
+        FLUSH_SECONDS.observe(time.perf_counter() - start, store=self.name)
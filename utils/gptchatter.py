@@ -1,7 +1,24 @@
-from openai import OpenAI
-import json, os
+from openai import (
+    OpenAI,
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    RateLimitError,
+    InternalServerError,
+)
+import asyncio, contextlib, json, os, random, re, time
+
+from utils.flusher import FlushScheduler, read_jsonl
+from utils.gptfunctions import query_minecraft_server, aquery_minecraft_server
+from utils.metrics import registry
 
-from utils.gptfunctions import query_minecraft_server
+OPENAI_SECONDS = registry.histogram(
+    "bot_openai_request_seconds", "Time until the chat completions API answered (headers only for streams).",
+    ("mode", "outcome"),
+)
+OPENAI_RETRIES = registry.counter("bot_openai_retries_total", "Chat completion requests retried after an error.")
+OPENAI_TOKENS = registry.counter("bot_openai_tokens_total", "Tokens reported in completion usage.", ("kind",))
+FAQ_HITS = registry.counter("bot_faq_hits_total", "Messages answered from the FAQ.", ("intent",))
 
 MODEL = "gpt-4o"
 GPT_DEFAULT_SYSTEM_PROMPT = (
@@ -99,28 +116,273 @@ GPT_DEFAULT_SYSTEM_PROMPT = (
     "✅ Your goal is to help, escalate when necessary, and keep things efficient and user-friendly."
 )
 
+# Conversations store only a prompt ID; the text is looked up when a request is built. Editing a
+# prompt here therefore applies to every open ticket that uses its ID. To keep old tickets on an
+# old prompt, give the new text a new ID and point DEFAULT_PROMPT_ID at it.
+PROMPTS = {
+    "default": GPT_DEFAULT_SYSTEM_PROMPT,
+}
+DEFAULT_PROMPT_ID = "default"
+
+
+def strip_system_prompt(messages):
+    # Conversations saved before prompt IDs existed start with a copy of the prompt text.
+    if messages and messages[0].get("role") == "system":
+        return messages[1:], True
+    return messages, False
+
+
+FUNCTIONS = [{
+    "name": "query_minecraft_server",
+    "description": "Get the current status of Bonk Network's Minecraft server.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "mode": {
+                "type": "string",
+                "enum": [
+                    "java_status"
+                ]
+            }
+        }
+    }
+}]
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+def estimate_tokens(message) -> int:
+    # Roughly four characters per token for English text, plus the per-message overhead.
+    text = message.get("content") or ""
+    if message.get("function_call"):
+        text += json.dumps(message["function_call"])
+    return len(text) // 4 + 4
+
+
+def trim_function_result(name, content):
+    if name != "query_minecraft_server":
+        return content
+    try:
+        status = json.loads(content)
+    except (TypeError, ValueError):
+        return content
+    if not isinstance(status, dict):
+        return content
+    return json.dumps({
+        "online": status.get("online"),
+        "players": {"online": (status.get("players") or {}).get("online")},
+        "version": status.get("version"),
+    })
+
+
+class FAQMatcher:
+    # Answers the questions the system prompt already has a fixed reply for without calling the
+    # model. A pattern has to match the whole message once greetings, politeness and punctuation are
+    # stripped, so a message that merely mentions a topic goes to the model. So does one that hits an
+    # entry's "exclude" pattern or matches more than one intent.
+    GREETING = re.compile(r"^(hi|hello|hey|yo|hii+)( there| staff| guys)?\b[\s,.!]*")
+    POLITENESS = re.compile(r"[\s,]*\b(please|pls|plz|thanks|thank you|thx|ty)$")
+
+    def __init__(self, faq_file="data/faq.json", max_words=20):
+        self.max_words = max_words
+        self.entries = []
+        try:
+            with open(faq_file, "r") as f:
+                for entry in json.load(f):
+                    pattern = re.compile("|".join(f"(?:{p})" for p in entry["patterns"]), re.IGNORECASE)
+                    exclude = entry.get("exclude")
+                    if exclude:
+                        exclude = re.compile("|".join(f"(?:{p})" for p in exclude), re.IGNORECASE)
+                    self.entries.append((entry["intent"], pattern, exclude, entry["answer"]))
+        except FileNotFoundError:
+            pass
+        self.checked = 0
+        self.hits = {}
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        text = " ".join(text.lower().split())
+        text = cls.GREETING.sub("", text)
+        text = text.strip(" ?!.,:;~")
+        text = cls.POLITENESS.sub("", text)
+        return text.strip(" ?!.,:;~")
+
+    def match(self, text):
+        self.checked += 1
+        if len(text.split()) > self.max_words:
+            return None
+        text = self.normalize(text)
+        matched = [
+            (intent, answer) for intent, pattern, exclude, answer in self.entries
+            if pattern.fullmatch(text) and not (exclude and exclude.search(text))
+        ]
+        if len(matched) != 1:
+            return None
+        intent, answer = matched[0]
+        self.hits[intent] = self.hits.get(intent, 0) + 1
+        FAQ_HITS.inc(intent=intent)
+        return answer
+
+    def stats(self) -> dict:
+        total_hits = sum(self.hits.values())
+        return {
+            "checked": self.checked,
+            "hits": total_hits,
+            "hit_rate": total_hits / self.checked if self.checked else 0.0,
+            "by_intent": dict(self.hits),
+        }
+
+
+class ContextWindow:
+    # Chooses what part of a conversation is sent with each request. The system prompt and the
+    # latest `keep_recent` messages always go out; older turns are added newest-first while they fit
+    # in `budget` tokens, and whatever falls off the front is folded into a short rolling summary.
+    def __init__(self, budget=6000, keep_recent=6, summary_budget=400):
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.summary_budget = summary_budget
+        self.summary = ""
+        self.summarized_upto = 0
+
+    def _summarize(self, dropped):
+        lines = []
+        for m in dropped:
+            if m.get("role") not in ("user", "assistant") or not m.get("content"):
+                continue
+            text = " ".join(m["content"].split())
+            if len(text) > 200:
+                text = text[:200] + "…"
+            lines.append(f"{m['role']}: {text}")
+        if not lines:
+            return
+        summary = "\n".join(filter(None, [self.summary, *lines]))
+        # Keep the most recent part of the summary when it outgrows its budget.
+        max_chars = self.summary_budget * 4
+        if len(summary) > max_chars:
+            summary = "…" + summary[-max_chars:]
+        self.summary = summary
+
+    def build(self, system_prompt, body):
+        system = [{"role": "system", "content": system_prompt}]
+        trimmed = [
+            dict(m, content=trim_function_result(m.get("name"), m["content"])) if m.get("role") == "function" else m
+            for m in body
+        ]
+        used = sum(estimate_tokens(m) for m in system) + (self.summary_budget if self.summary else 0)
+        start = len(trimmed)
+        while start > 0:
+            cost = estimate_tokens(trimmed[start - 1])
+            if len(trimmed) - start >= self.keep_recent and used + cost > self.budget:
+                break
+            used += cost
+            start -= 1
+        # Never send a function result without the call that produced it.
+        if start < len(trimmed) and trimmed[start].get("role") == "function" and start > 0:
+            start -= 1
+
+        if start > self.summarized_upto:
+            self._summarize(body[self.summarized_upto:start])
+            self.summarized_upto = start
+
+        context = list(system)
+        if self.summary and start > 0:
+            context.append({"role": "system", "content": "Summary of earlier messages in this ticket:\n" + self.summary})
+        context.extend(trimmed[start:])
+        return context
+
 
 class Chat:
-    def __init__(self, key, messages=None):
+    def __init__(self, key=None, messages=None, timeout=30.0, max_retries=3, backoff=1.0,
+                 client=None, async_client=None, staff_ping_used=None, context_budget=6000,
+                 prompt_id=DEFAULT_PROMPT_ID, limiter=None):
         if messages is not None:
             clean = []
-            for m in messages:
+            for m in strip_system_prompt(messages)[0]:
                 if "content" in m and m["content"] is None:
                     continue
                 clean.append(m)
             self.messages = clean
         else:
-            self.messages = [
-                {"role": "system", "content": GPT_DEFAULT_SYSTEM_PROMPT}
-            ]
-
-        self.staff_ping_used = any(
-            m.get("role") == "assistant"
-            and isinstance(m.get("content"), str)
-            and "<@&" in m["content"]
-            for m in self.messages
-        )
-        self.client = OpenAI(api_key=key)
+            self.messages = []
+        self.prompt_id = prompt_id
+
+        if staff_ping_used is None:
+            staff_ping_used = any(
+                m.get("role") == "assistant"
+                and isinstance(m.get("content"), str)
+                and "<@&" in m["content"]
+                for m in self.messages
+            )
+        self.staff_ping_used = staff_ping_used
+        self.client = client or OpenAI(api_key=key, timeout=timeout)
+        # Retries are done by _acreate so the backoff is ours to tune.
+        self.async_client = async_client or AsyncOpenAI(api_key=key, timeout=timeout, max_retries=0)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.context = ContextWindow(budget=context_budget)
+        # A GPTScheduler, or None. Requests past the one a job was scheduled for are charged to it, and
+        # each request's estimate is corrected to the usage the API reports.
+        self.limiter = limiter
+
+    @property
+    def system_prompt(self) -> str:
+        return PROMPTS.get(self.prompt_id, PROMPTS[DEFAULT_PROMPT_ID])
+
+    def _context(self):
+        return self.context.build(self.system_prompt, self.messages)
+
+    def _record_usage(self, usage, estimate=None):
+        if usage:
+            OPENAI_TOKENS.inc(usage.prompt_tokens, kind="prompt")
+            OPENAI_TOKENS.inc(usage.completion_tokens, kind="completion")
+            if self.limiter is not None and estimate is not None:
+                self.limiter.reconcile(estimate, usage.total_tokens)
+
+    def _create(self, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            resp = self.client.chat.completions.create(model=MODEL, **kwargs)
+            outcome = "ok"
+        finally:
+            OPENAI_SECONDS.observe(time.perf_counter() - start, mode="sync", outcome=outcome)
+        self._record_usage(resp.usage)
+        return resp
+
+    @property
+    def reply_turns(self) -> int:
+        return sum(1 for m in self.messages if m.get("role") == "assistant" and m.get("content"))
+
+    def estimate_request_tokens(self, prompt="", completion=500) -> int:
+        history = len(self.system_prompt) // 4 + sum(estimate_tokens(m) for m in self.messages)
+        return min(history, self.context.budget) + len(prompt) // 4 + completion
+
+    def record_canned_reply(self, prompt, answer):
+        self.messages.append({"role": "user", "content": prompt})
+        self._record_reply(answer)
+
+    def _record_function_call(self, name, arguments):
+        self.messages.append({
+            "role": "assistant",
+            "name": name,
+            "function_call": {
+                "name": name,
+                "arguments": arguments
+            }
+        })
+        return json.loads(arguments)
+
+    def _record_function_result(self, name, result):
+        self.messages.append({
+            "role": "function",
+            "name": name,
+            "content": result
+        })
+
+    def _record_reply(self, content):
+        self.messages.append({"role": "assistant", "content": content})
+        if isinstance(content, str) and "<@&" in content:
+            self.staff_ping_used = True
 
     def chat_with_gpt(self, prompt):
         if self.staff_ping_used:
@@ -128,106 +390,306 @@ class Chat:
 
         self.messages.append({"role": "user", "content": prompt})
 
-        functions = [{
-            "name": "query_minecraft_server",
-            "description": "Get the current status of Bonk Network's Minecraft server.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "mode": {
-                        "type": "string",
-                        "enum": [
-                            "java_status"
-                        ]
-                    }
-                }
-            }
-        }]
-
-        resp = self.client.chat.completions.create(
-            model=MODEL,
-            messages=self.messages,
-            functions=functions,
+        resp = self._create(
+            messages=self._context(),
+            functions=FUNCTIONS,
             function_call="auto"
         )
         msg = resp.choices[0].message
 
         if msg.function_call:
-            self.messages.append({
-                "role": "assistant",
-                "name": msg.function_call.name,
-                "function_call": {
-                    "name": msg.function_call.name,
-                    "arguments": msg.function_call.arguments
-                }
-            })
-
-            args = json.loads(msg.function_call.arguments)
+            args = self._record_function_call(msg.function_call.name, msg.function_call.arguments)
             result = query_minecraft_server(**args)
+            self._record_function_result(msg.function_call.name, result)
 
-            self.messages.append({
-                "role": "function",
-                "name": msg.function_call.name,
-                "content": result
-            })
+            followup = self._create(messages=self._context())
+            final_msg = followup.choices[0].message.content
+            self._record_reply(final_msg)
+            return final_msg
 
-            followup = self.client.chat.completions.create(
-                model=MODEL,
-                messages=self.messages
-            )
+        content = msg.content
+        self._record_reply(content)
+        return content
+
+    # `prepaid` is what the scheduler already charged for this request when it started the job; every
+    # other attempt is charged to the limiter before it goes out.
+    async def _acreate(self, prepaid=0, **kwargs):
+        mode = "stream" if kwargs.get("stream") else "async"
+        if kwargs.get("stream"):
+            # Streams only report token usage, in a final chunk without choices, when asked to.
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        estimate = prepaid or self.estimate_request_tokens()
+        attempt = 0
+        while True:
+            if not prepaid and self.limiter is not None:
+                await self.limiter.acquire(estimate)
+            prepaid = 0
+            start = time.perf_counter()
+            try:
+                resp = await self.async_client.chat.completions.create(model=MODEL, **kwargs)
+            except RETRYABLE_ERRORS:
+                OPENAI_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome="error")
+                if attempt >= self.max_retries:
+                    raise
+                OPENAI_RETRIES.inc()
+                await asyncio.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+                attempt += 1
+            except Exception:
+                OPENAI_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome="error")
+                raise
+            else:
+                OPENAI_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome="ok")
+                if mode == "stream":
+                    return self._metered(resp, estimate)
+                self._record_usage(resp.usage, estimate)
+                return resp
+
+    async def _metered(self, stream, estimate):
+        async for chunk in stream:
+            self._record_usage(chunk.usage, estimate)
+            yield chunk
+
+    async def achat_with_gpt(self, prompt, prepaid_tokens=0):
+        if self.staff_ping_used:
+            return None
+
+        self.messages.append({"role": "user", "content": prompt})
+
+        resp = await self._acreate(
+            prepaid_tokens,
+            messages=self._context(),
+            functions=FUNCTIONS,
+            function_call="auto"
+        )
+        msg = resp.choices[0].message
+
+        if msg.function_call:
+            args = self._record_function_call(msg.function_call.name, msg.function_call.arguments)
+            result = await aquery_minecraft_server(**args)
+            self._record_function_result(msg.function_call.name, result)
+
+            followup = await self._acreate(messages=self._context())
             final_msg = followup.choices[0].message.content
-            self.messages.append({"role": "assistant", "content": final_msg})
+            self._record_reply(final_msg)
             return final_msg
 
         content = msg.content
-        self.messages.append({"role": "assistant", "content": content})
+        self._record_reply(content)
         return content
 
 
-class GPTChatterDB:
-    def __init__(self, key, db_file="data/gptchatter.json"):
-        self.key = key
-        self.db_file = db_file
+    # Like achat_with_gpt, but yields the reply piece by piece as the model produces it. The complete
+    # reply is recorded in messages once the stream ends.
+    async def astream_chat_with_gpt(self, prompt, prepaid_tokens=0):
+        if self.staff_ping_used:
+            return
 
-        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self.messages.append({"role": "user", "content": prompt})
+
+        stream = await self._acreate(
+            prepaid_tokens,
+            messages=self._context(),
+            functions=FUNCTIONS,
+            function_call="auto",
+            stream=True
+        )
+        parts = []
+        call_name, call_arguments = "", ""
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.function_call:
+                call_name += delta.function_call.name or ""
+                call_arguments += delta.function_call.arguments or ""
+            elif delta.content:
+                parts.append(delta.content)
+                yield delta.content
+
+        if call_name:
+            args = self._record_function_call(call_name, call_arguments or "{}")
+            result = await aquery_minecraft_server(**args)
+            self._record_function_result(call_name, result)
+
+            stream = await self._acreate(messages=self._context(), stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+
+        self._record_reply("".join(parts))
 
+
+class GPTChatterDB:
+    # Each conversation lives in its own JSONL shard, <shards_dir>/<ticket id>.jsonl. A shard is a log of
+    # {"meta": {...}} and {"message": {...}} lines; later meta lines win and messages are replayed in order,
+    # so saving a conversation only appends what changed since the last flush.
+    def __init__(self, key, shards_dir="data/gptchatter", legacy_file="data/gptchatter.json",
+                 flush_interval=5.0, flush_threshold=50, timeout=30.0, max_retries=3, context_budget=6000,
+                 limiter=None):
+        self.key = key
+        self.shards_dir = shards_dir
+        self.legacy_file = legacy_file
+        self.max_retries = max_retries
+        self.context_budget = context_budget
+        self.limiter = limiter
+        # One pair of clients (and so one connection pool each) shared by every conversation.
+        self.client = OpenAI(api_key=key, timeout=timeout)
+        self.async_client = AsyncOpenAI(api_key=key, timeout=timeout, max_retries=0)
+
+        os.makedirs(self.shards_dir, exist_ok=True)
+
+        self.shard_keys = set()
         self.chat_objs = {}
+        # Per materialized conversation: how many messages and which meta are already on disk.
+        self._persisted_counts = {}
+        self._persisted_meta = {}
+        self._dirty = set()
+        self._deleted = set()
+        self.flusher = FlushScheduler(self._prepare_flush, flush_interval, flush_threshold, name="gptchatter")
         self.load()
 
-    def load(self):
-        try:
-            with open(self.db_file, "r") as f:
-                chat_data = json.load(f)
-        except FileNotFoundError:
-            return
+    def _shard_path(self, user):
+        return os.path.join(self.shards_dir, f"{user}.jsonl")
 
+    # Startup only lists the shard files; a conversation is read when a ticket actually needs its Chat.
+    def load(self):
         self.chat_objs = {}
-        for user, messages in chat_data.items():
-            self.chat_objs[user] = Chat(self.key, messages=messages)
-
-    def save(self):
-        to_save = {
-            user: chat.messages for user, chat in self.chat_objs.items()
+        self._persisted_counts = {}
+        self._persisted_meta = {}
+        self.shard_keys = {
+            entry.name[:-len(".jsonl")]
+            for entry in os.scandir(self.shards_dir)
+            if entry.is_file() and entry.name.endswith(".jsonl")
         }
-        with open(self.db_file, "w") as f:
-            json.dump(to_save, f, indent=4)
+        if os.path.exists(self.legacy_file):
+            self._migrate_legacy()
+
+    def _migrate_legacy(self):
+        with open(self.legacy_file, "r") as f:
+            chat_data = json.load(f)
+
+        for user, record in chat_data.items():
+            if user in self.shard_keys:
+                continue
+            if isinstance(record, list):
+                record = {"messages": record, "staff_ping_used": None}
+            if "prompt_id" not in record:
+                record["messages"] = strip_system_prompt(record["messages"])[0]
+                record["prompt_id"] = DEFAULT_PROMPT_ID
+            meta = {"staff_ping_used": record.get("staff_ping_used"), "prompt_id": record["prompt_id"]}
+            lines = [{"meta": meta}] + [{"message": m} for m in record["messages"]]
+            self._append_shard(user, lines)
+            self.shard_keys.add(user)
+        os.replace(self.legacy_file, self.legacy_file + ".migrated")
+
+    def _read_shard(self, user):
+        meta = {"staff_ping_used": None, "prompt_id": DEFAULT_PROMPT_ID}
+        messages = []
+        with open(self._shard_path(user), "r") as f:
+            for record in read_jsonl(f):
+                if "message" in record:
+                    messages.append(record["message"])
+                elif "meta" in record:
+                    meta.update(record["meta"])
+        return meta, messages
+
+    def _append_shard(self, user, lines):
+        with open(self._shard_path(user), "a") as f:
+            f.write("".join(json.dumps(line) + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _new_chat(self, messages=None, staff_ping_used=None, prompt_id=DEFAULT_PROMPT_ID):
+        return Chat(
+            messages=messages,
+            prompt_id=prompt_id,
+            max_retries=self.max_retries,
+            client=self.client,
+            async_client=self.async_client,
+            staff_ping_used=staff_ping_used,
+            context_budget=self.context_budget,
+            limiter=self.limiter,
+        )
+
+    def _prepare_flush(self):
+        deleted = [(user, self._shard_path(user)) for user in self._deleted]
+        appends = []
+        for user in self._dirty:
+            chat = self.chat_objs.get(user)
+            if chat is None:
+                continue
+            lines = []
+            meta = {"staff_ping_used": chat.staff_ping_used, "prompt_id": chat.prompt_id}
+            if meta != self._persisted_meta.get(user):
+                lines.append({"meta": meta})
+            lines.extend({"message": m} for m in chat.messages[self._persisted_counts.get(user, 0):])
+            if lines:
+                appends.append((user, chat, lines, meta, len(chat.messages)))
+        self._deleted = set()
+        self._dirty = set()
+
+        # What is on disk only moves forward once a shard has been written; anything left over from a
+        # failed flush is marked again, so the next one writes it from the same place.
+        def write():
+            removed = written = 0
+            try:
+                for user, path in deleted:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                    removed += 1
+                for user, chat, lines, meta, count in appends:
+                    self._append_shard(user, lines)
+                    if self.chat_objs.get(user) is chat:
+                        self._persisted_meta[user] = meta
+                        self._persisted_counts[user] = count
+                    written += 1
+            except Exception:
+                self._deleted.update(user for user, _ in deleted[removed:])
+                self._dirty.update(user for user, *_ in appends[written:])
+                raise
+
+        return write
+
+    def save(self, user):
+        self._dirty.add(user)
+        self.flusher.mark_dirty()
+
+    def flush(self):
+        self.flusher.flush()
 
     def add_user(self, user):
-        if user in self.chat_objs:
-            return self.chat_objs[user]
-        chat_obj = Chat(self.key)
+        chat_obj = self.get_user(user)
+        if chat_obj:
+            return chat_obj
+        chat_obj = self._new_chat(staff_ping_used=False)
+        self.shard_keys.add(user)
         self.chat_objs[user] = chat_obj
-        self.save()
+        self._persisted_counts[user] = 0
+        self.save(user)
         return chat_obj
 
     def get_user(self, user):
-        return self.chat_objs.get(user)
+        chat_obj = self.chat_objs.get(user)
+        if chat_obj is None and user in self.shard_keys:
+            meta, messages = self._read_shard(user)
+            chat_obj = self._new_chat(messages, meta["staff_ping_used"], meta["prompt_id"])
+            self.chat_objs[user] = chat_obj
+            # Chat drops unusable messages on load, so count what it kept; new ones are appended after.
+            self._persisted_counts[user] = len(chat_obj.messages)
+            self._persisted_meta[user] = meta
+        return chat_obj
 
     def update_user(self, user):
-        if user in self.chat_objs:
-            self.save()
+        if user in self.shard_keys:
+            self.save(user)
 
     def delete_user(self, user):
-        if user in self.chat_objs:
-            del self.chat_objs[user]
-            self.save()
+        if user in self.shard_keys:
+            self.shard_keys.discard(user)
+            self.chat_objs.pop(user, None)
+            self._persisted_counts.pop(user, None)
+            self._persisted_meta.pop(user, None)
+            self._dirty.discard(user)
+            self._deleted.add(user)
+            self.flusher.mark_dirty()
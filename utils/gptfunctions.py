@@ -1,6 +1,35 @@
+import asyncio
+import time
+
+import aiohttp
 import requests
 import base64
 
+from utils.metrics import registry
+
+BASE_URL = "https://api.mcsrvstat.us"
+HEADERS = {"User-Agent": "BonkMCTicketBot/1.0 (contact: support@bonkmc.net)"}
+
+MODE_PATHS = {
+    "java_status": "/3/{address}",
+    "bedrock_status": "/bedrock/3/{address}",
+    "simple_status": "/simple/{address}",
+    "bedrock_simple_status": "/bedrock/simple/{address}",
+    "icon": "/icon/{address}",
+    "debug_ping": "/debug/ping/{address}",
+    "debug_query": "/debug/query/{address}",
+    "debug_bedrock": "/debug/bedrock/{address}",
+}
+SIMPLE_MODES = ("simple_status", "bedrock_simple_status")
+
+MCSRVSTAT_SECONDS = registry.histogram(
+    "bot_mcsrvstat_request_seconds", "Time spent on Minecraft server status API requests.", ("mode", "outcome")
+)
+MCSRVSTAT_LOOKUPS = registry.counter(
+    "bot_mcsrvstat_lookups_total", "Status lookups by how they were answered.", ("result",)
+)
+
+
 def query_minecraft_server(address: str="play.bonkmc.net", mode: str = "java_status") -> str:
     """
     Query the Minecraft Server Status API.
@@ -19,51 +48,115 @@ def query_minecraft_server(address: str="play.bonkmc.net", mode: str = "java_sta
       - "True" or "False" for simple_status modes
       - Base64‐encoded PNG string for "icon"
     """
-    BASE_URL = "https://api.mcsrvstat.us"
-    headers = {"User-Agent": "BonkMCTicketBot/1.0 (contact: support@bonkmc.net)"}
-
-    if mode == "java_status":
-        url = f"{BASE_URL}/3/{address}"
-        r = requests.get(url, headers=headers); r.raise_for_status()
-        return r.text
-
-    if mode == "bedrock_status":
-        url = f"{BASE_URL}/bedrock/3/{address}"
-        r = requests.get(url, headers=headers); r.raise_for_status()
-        return r.text
-
-    if mode == "simple_status":
-        url = f"{BASE_URL}/simple/{address}"
-        r = requests.get(url, headers=headers)
-        return str(r.status_code == 200)
+    if mode not in MODE_PATHS:
+        raise ValueError(f"Unsupported mode: {mode}")
+
+    url = BASE_URL + MODE_PATHS[mode].format(address=address)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        r = requests.get(url, headers=HEADERS)
+        outcome = "ok"
+    finally:
+        MCSRVSTAT_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome=outcome)
 
-    if mode == "bedrock_simple_status":
-        url = f"{BASE_URL}/bedrock/simple/{address}"
-        r = requests.get(url, headers=headers)
+    if mode in SIMPLE_MODES:
         return str(r.status_code == 200)
 
+    r.raise_for_status()
     if mode == "icon":
-        url = f"{BASE_URL}/icon/{address}"
-        r = requests.get(url, headers=headers); r.raise_for_status()
         return base64.b64encode(r.content).decode("ascii")
+    return r.text
+
+
+class MinecraftStatusClient:
+    """
+    Async counterpart of query_minecraft_server for use on the event loop.
+    Keeps one pooled HTTP session, caches each (address, mode) for `ttl` seconds, lets concurrent
+    callers for the same key share a single request, and falls back to a cached value up to
+    `stale_ttl` seconds old when the API cannot be reached.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, ttl: float = 30.0, stale_ttl: float = 300.0,
+                 timeout: float = 10.0, max_connections: int = 10):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._session = None
+        self._cache = {}
+        self._inflight = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+            )
+        return self._session
+
+    async def query(self, address: str = "play.bonkmc.net", mode: str = "java_status") -> str:
+        if mode not in MODE_PATHS:
+            raise ValueError(f"Unsupported mode: {mode}")
+
+        key = (address, mode)
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            MCSRVSTAT_LOOKUPS.inc(result="cached")
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            MCSRVSTAT_LOOKUPS.inc(result="fetched")
+            task = asyncio.ensure_future(self._fetch(address, mode))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            MCSRVSTAT_LOOKUPS.inc(result="shared")
+
+        try:
+            # Shielded so one caller being cancelled doesn't cancel the request for everyone else.
+            return await asyncio.shield(task)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if cached and time.monotonic() - cached[0] < self.stale_ttl:
+                MCSRVSTAT_LOOKUPS.inc(result="stale")
+                return cached[1]
+            raise
+
+    async def _fetch(self, address: str, mode: str) -> str:
+        url = self.base_url + MODE_PATHS[mode].format(address=address)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self._get_session().get(url) as r:
+                if mode in SIMPLE_MODES:
+                    result = str(r.status == 200)
+                else:
+                    r.raise_for_status()
+                    if mode == "icon":
+                        result = base64.b64encode(await r.read()).decode("ascii")
+                    else:
+                        result = await r.text()
+            outcome = "ok"
+        finally:
+            MCSRVSTAT_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome=outcome)
+        self._cache[(address, mode)] = (time.monotonic(), result)
+        return result
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
 
-    if mode == "debug_ping":
-        url = f"{BASE_URL}/debug/ping/{address}"
-        r = requests.get(url, headers=headers); r.raise_for_status()
-        return r.text
+status_client = MinecraftStatusClient()
 
-    if mode == "debug_query":
-        url = f"{BASE_URL}/debug/query/{address}"
-        r = requests.get(url, headers=headers); r.raise_for_status()
-        return r.text
 
-    if mode == "debug_bedrock":
-        url = f"{BASE_URL}/debug/bedrock/{address}"
-        r = requests.get(url, headers=headers); r.raise_for_status()
-        return r.text
+async def aquery_minecraft_server(address: str = "play.bonkmc.net", mode: str = "java_status") -> str:
+    return await status_client.query(address, mode)
 
-    raise ValueError(f"Unsupported mode: {mode}")
 
 if __name__ == "__main__":
         result = query_minecraft_server("play.bonkmc.net", mode="java_status")
-        print(result)
\ No newline at end of file
+        print(result)
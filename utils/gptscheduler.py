@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+from utils.metrics import registry
+from utils.tasks import spawn
+
+GPT_SHED = registry.counter("bot_gpt_shed_total", "GPT replies refused because the queue was full.")
+
+
+class SchedulerSaturated(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        # A negative amount hands tokens back, e.g. when a request used fewer than it was charged.
+        self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+
+class GPTScheduler:
+    # Every model request goes through submit(). Jobs run in priority order (lower first), at most
+    # `max_concurrency` at a time, never two for the same ticket at once, and only when both the
+    # request and the token bucket allow it. Once `max_queue` jobs are waiting, new ones are refused
+    # with SchedulerSaturated so the caller can send the user elsewhere.
+    def __init__(self, max_concurrency: int = 4, requests_per_minute: int = 500,
+                 tokens_per_minute: int = 30000, max_queue: int = 50):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._queue = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._active_tickets = set()
+        self._timer = None
+        self._tasks = set()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.wait_times = deque(maxlen=1000)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def submit(self, ticket_id: str, run, priority: int = 0, estimated_tokens: int = 1000):
+        if len(self._queue) >= self.max_queue:
+            self.shed += 1
+            GPT_SHED.inc()
+            raise SchedulerSaturated()
+        self.submitted += 1
+        future = asyncio.get_running_loop().create_future()
+        entry = {
+            "ticket_id": ticket_id,
+            "run": run,
+            "tokens": estimated_tokens,
+            "future": future,
+            "enqueued_at": time.monotonic(),
+        }
+        heapq.heappush(self._queue, (priority, next(self._seq), entry))
+        self._pump()
+        return await future
+
+    def _next_entry(self):
+        skipped = []
+        entry = None
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            if item[2]["ticket_id"] in self._active_tickets:
+                skipped.append(item)
+                continue
+            entry = item
+            break
+        for item in skipped:
+            heapq.heappush(self._queue, item)
+        return entry
+
+    def _pump(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._running < self.max_concurrency and self._queue:
+            item = self._next_entry()
+            if item is None:
+                return
+            entry = item[2]
+            delay = max(self.requests.delay_for(1), self.tokens.delay_for(entry["tokens"]))
+            if delay > 0:
+                heapq.heappush(self._queue, item)
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            self.requests.consume(1)
+            self.tokens.consume(entry["tokens"])
+            self._running += 1
+            self._active_tickets.add(entry["ticket_id"])
+            spawn(self._execute(entry), self._tasks, "Error running scheduled GPT job:")
+
+    async def acquire(self, tokens: int):
+        # For requests a running job makes beyond the one it was queued for (function-call follow-ups,
+        # retries). They wait on the same buckets as queued jobs but keep the job's slot.
+        while True:
+            delay = max(self.requests.delay_for(1), self.tokens.delay_for(tokens))
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+
+    def reconcile(self, estimated: int, actual: int):
+        # Replaces the estimate a request was charged with the usage the API reported for it.
+        self.tokens.consume(actual - estimated)
+        if actual < estimated:
+            self._pump()
+
+    async def _execute(self, entry: dict):
+        self.wait_times.append(time.monotonic() - entry["enqueued_at"])
+        future = entry["future"]
+        try:
+            result = await entry["run"]()
+        except BaseException as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.completed += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._running -= 1
+            self._active_tickets.discard(entry["ticket_id"])
+            self._pump()
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "queue_depth": self.queue_depth,
+            "running": self._running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,58 @@
+import json
+import os
+
+
+class RoleRegistry:
+    # Staff ranks from data/roleslist.json, highest first, each mapped to its role IDs. The file is parsed
+    # once and re-read only when its mtime changes; role sets are built once per exclude configuration.
+    def __init__(self, roles_file: str = "data/roleslist.json"):
+        self.roles_file = roles_file
+        self._mtime = None
+        self.ranks = []
+        self.role_ids = {}
+        self._sets = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.roles_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        roles_dict = {}
+        if mtime is not None:
+            with open(self.roles_file) as f:
+                roles_dict = json.load(f)
+        self.ranks = list(roles_dict)
+        self.role_ids = {name: frozenset(int(i) for i in ids) for name, ids in roles_dict.items()}
+        self._sets = {}
+        self._mtime = mtime
+
+    def staff_roles(self, exclude=(), exclude_acts_as_include: bool = False) -> frozenset:
+        self._refresh()
+        key = (frozenset(exclude), exclude_acts_as_include)
+        roles = self._sets.get(key)
+        if roles is None:
+            roles = frozenset().union(*(
+                ids for name, ids in self.role_ids.items()
+                if exclude_acts_as_include or name not in key[0]
+            ))
+            self._sets[key] = roles
+        return roles
+
+    def roles_at_least(self, rank: str) -> frozenset:
+        self._refresh()
+        key = ("at_least", rank)
+        roles = self._sets.get(key)
+        if roles is None:
+            if rank not in self.role_ids:
+                raise ValueError(f"Unknown staff rank: {rank}")
+            roles = frozenset().union(*(self.role_ids[name] for name in self.ranks[:self.ranks.index(rank) + 1]))
+            self._sets[key] = roles
+        return roles
+
+    def is_staff(self, user_role_ids, exclude=(), exclude_acts_as_include: bool = False) -> bool:
+        return not self.staff_roles(exclude, exclude_acts_as_include).isdisjoint(user_role_ids)
+
+    def is_at_least(self, user_role_ids, rank: str) -> bool:
+        return not self.roles_at_least(rank).isdisjoint(user_role_ids)
@@ -0,0 +1,16 @@
+import asyncio
+
+
+def spawn(coro, owner: set, error_message: str = "Error in background task:") -> asyncio.Task:
+    # Runs `coro` as a task held in `owner` until it finishes; the event loop only keeps weak references
+    # to tasks, so one nobody holds can be collected mid-await. Errors that escape it are printed.
+    task = asyncio.ensure_future(coro)
+    owner.add(task)
+    task.add_done_callback(lambda done: _finished(done, owner, error_message))
+    return task
+
+
+def _finished(task: asyncio.Task, owner: set, error_message: str):
+    owner.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(error_message, task.exception())
@@ -1,8 +1,172 @@
-import json
+import asyncio
+import gc
 import os
-from datetime import datetime, timezone
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils.flusher import FLUSH_SECONDS, FlushScheduler
+from utils.ticketstorage import JSONTicketStorage, SnapshotRecord, TicketArchive
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def pack_timestamp(value):
+    # ISO-8601 UTC string -> integer microseconds since the epoch. Only strings in exactly the shape
+    # datetime.isoformat() produces for UTC are packed, so unpack_timestamp always gives back the same
+    # string; anything else (other offsets, naive times) is kept as it was.
+    if not isinstance(value, str) or not value.endswith("+00:00"):
+        return value
+    if len(value) == 32:
+        if value[19] != ".":
+            return value
+    elif len(value) != 25:
+        return value
+    if value[10] != "T" or value[13] != ":" or value[16] != ":":
+        return value
+    try:
+        micros = (datetime.fromisoformat(value) - _EPOCH) // _MICROSECOND
+    except ValueError:
+        return value
+    if len(value) == 32 and micros % 1_000_000 == 0:
+        # isoformat() drops a zero fraction, so this one would not come back the same.
+        return value
+    return micros
+
+
+def unpack_timestamp(value):
+    if isinstance(value, int):
+        return (_EPOCH + value * _MICROSECOND).isoformat()
+    return value
+
+
+def timestamp_seconds(value) -> float:
+    # Seconds since the epoch for a packed timestamp, None for a missing one.
+    if isinstance(value, int):
+        return value / 1_000_000
+    if value:
+        return datetime.fromisoformat(value).timestamp()
+    return None
+
+
+def _now() -> int:
+    return time.time_ns() // 1000
+
+
+def _timestamp_property(slot: str) -> property:
+    def getter(self):
+        return unpack_timestamp(getattr(self, slot))
+
+    def setter(self, value):
+        setattr(self, slot, pack_timestamp(value))
+
+    return property(getter, setter)
+
+
+LOG_MESSAGE = "message"
+LOG_ATTACHMENT = "attachment"
+LOG_SYSTEM = "system"
+LOG_ENTRY_FIELDS = ("timestamp", "type", "author_id", "message_id", "content")
+# Entries written before logs were structured: {"timestamp", "message"}, with user messages flattened
+# into "[display name (user id)]: text".
+_LEGACY_AUTHOR = re.compile(r"\[(.*) \((\d+)\)\]: ", re.DOTALL)
+
+
+def make_log_entry(timestamp: str, content: str, entry_type: str = LOG_SYSTEM, author_id: str = None,
+                   message_id: str = None) -> dict:
+    return {
+        "timestamp": timestamp,
+        "type": entry_type,
+        "author_id": author_id,
+        "message_id": message_id,
+        "content": content,
+    }
+
+
+def read_log_entry(entry: dict, authors: dict = None) -> dict:
+    # Any log entry, legacy or structured, as a structured entry plus "author_name": the name from the
+    # ticket's author table, or the one a legacy entry was written with.
+    if "type" in entry:
+        structured = dict(entry)
+        structured["author_name"] = (authors or {}).get(entry.get("author_id"))
+        return structured
+    message = entry.get("message") or ""
+    match = _LEGACY_AUTHOR.match(message)
+    if match is None:
+        structured = make_log_entry(entry.get("timestamp"), message)
+        structured["author_name"] = None
+        return structured
+    structured = make_log_entry(entry.get("timestamp"), message[match.end():], LOG_MESSAGE, match.group(2))
+    structured["author_name"] = match.group(1)
+    return structured
+
+
+class TicketLog:
+    # A ticket's log entries packed as tuples with packed timestamps: (timestamp, type, author_id,
+    # message_id, content) for structured entries and (timestamp, message) for legacy ones. Entries go in
+    # and come out as dicts; an entry of any other shape is kept as the dict it was.
+    __slots__ = ("_entries",)
+
+    def __init__(self, entries=()):
+        self._entries = [self._pack(entry) for entry in entries]
+
+    @staticmethod
+    def _pack(entry):
+        if len(entry) == 5 and all(field in entry for field in LOG_ENTRY_FIELDS):
+            entry_type, author_id = entry["type"], entry["author_id"]
+            return (
+                pack_timestamp(entry["timestamp"]),
+                sys.intern(entry_type) if entry_type else entry_type,
+                sys.intern(author_id) if author_id else author_id,
+                entry["message_id"],
+                entry["content"],
+            )
+        if len(entry) == 2 and "timestamp" in entry and "message" in entry:
+            return (pack_timestamp(entry["timestamp"]), entry["message"])
+        return entry
+
+    @staticmethod
+    def _unpack(entry) -> dict:
+        if isinstance(entry, tuple):
+            if len(entry) == 5:
+                return make_log_entry(unpack_timestamp(entry[0]), entry[4], entry[1], entry[2], entry[3])
+            return {"timestamp": unpack_timestamp(entry[0]), "message": entry[1]}
+        return entry
+
+    def append(self, entry: dict):
+        self._entries.append(self._pack(entry))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return map(self._unpack, self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._unpack(entry) for entry in self._entries[index]]
+        return self._unpack(self._entries[index])
+
+    def __eq__(self, other):
+        if isinstance(other, TicketLog):
+            return self._entries == other._entries
+        return list(self) == other
+
+    def by_author(self, author_id: str) -> list:
+        # Structured entries only; compares the packed author IDs without unpacking anything else.
+        return [self._unpack(entry) for entry in self._entries
+                if isinstance(entry, tuple) and len(entry) == 5 and entry[2] == author_id]
+
+    def to_list(self) -> list:
+        return list(self)
+
 
 class IGN:
+    __slots__ = ("username",)
+
     def __init__(self, username: str):
         self.username = username
 
@@ -18,6 +182,17 @@ class IGN:
 
 
 class Ticket:
+    # Timestamps are held packed (see pack_timestamp) and only turned back into ISO strings when read;
+    # the *_ts properties give seconds since the epoch without parsing anything. Status and category come
+    # from a handful of values and are interned so every ticket shares the same strings.
+    __slots__ = (
+        "ticket_id", "user_id", "channel_id", "subject", "reason", "category", "ign", "status",
+        "_created_at", "_updated_at", "_last_closed_at", "_last_reopened_at", "_logs", "log_loader", "authors",
+    )
+
+    # Set on tickets that are still an undecoded record of a binary snapshot.
+    snapshot_record = None
+
     def __init__(
         self,
         ticket_id: str,
@@ -33,23 +208,56 @@ class Ticket:
         logs: list = None,
         last_closed_at: str = None,
         last_reopened_at: str = None,
+        log_loader=None,
+        authors: dict = None,
     ):
         self.ticket_id = ticket_id
         self.user_id = user_id
         self.channel_id = channel_id
         self.subject = subject
         self.reason = reason
-        self.category = category
+        self.category = sys.intern(category) if category else category
         self.ign = ign
-        self.status = status
-        self.created_at = created_at or datetime.now(timezone.utc).isoformat()
-        self.updated_at = updated_at or datetime.now(timezone.utc).isoformat()
-        self.logs = logs if logs is not None else []
-        self.last_closed_at = last_closed_at
-        self.last_reopened_at = last_reopened_at
-
-    def to_dict(self) -> dict:
-        return {
+        self.status = sys.intern(status) if status else status
+        self._created_at = pack_timestamp(created_at) if created_at else _now()
+        self._updated_at = pack_timestamp(updated_at) if updated_at else _now()
+        self._logs = TicketLog(logs) if logs is not None else None
+        self.log_loader = log_loader
+        self._last_closed_at = pack_timestamp(last_closed_at)
+        self._last_reopened_at = pack_timestamp(last_reopened_at)
+        # Display names of everyone who has written to the ticket, by user ID; log entries only carry the ID.
+        self.authors = authors or None
+
+    created_at = _timestamp_property("_created_at")
+    updated_at = _timestamp_property("_updated_at")
+    last_closed_at = _timestamp_property("_last_closed_at")
+    last_reopened_at = _timestamp_property("_last_reopened_at")
+
+    @property
+    def updated_ts(self) -> float:
+        return timestamp_seconds(self._updated_at)
+
+    @property
+    def last_closed_ts(self) -> float:
+        return timestamp_seconds(self._last_closed_at)
+
+    @property
+    def last_reopened_ts(self) -> float:
+        return timestamp_seconds(self._last_reopened_at)
+
+    # Transcripts live in their own storage and are only read the first time they are needed.
+    @property
+    def logs(self) -> TicketLog:
+        if self._logs is None:
+            self._logs = TicketLog(self.log_loader(self.ticket_id) if self.log_loader else ())
+        return self._logs
+
+    @logs.setter
+    def logs(self, value: list):
+        self._logs = value if isinstance(value, TicketLog) else TicketLog(value)
+
+    def to_dict(self, include_logs: bool = True) -> dict:
+        data = {
             "ticket_id": self.ticket_id,
             "user_id": self.user_id,
             "channel_id": self.channel_id,
@@ -60,16 +268,27 @@ class Ticket:
             "status": self.status,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
-            "logs": self.logs,
+            "logs": None,
             "last_closed_at": self.last_closed_at,
             "last_reopened_at": self.last_reopened_at,
         }
+        if self.authors:
+            data["authors"] = dict(self.authors)
+        if include_logs:
+            data["logs"] = self.logs.to_list()
+        else:
+            del data["logs"]
+        return data
 
     @classmethod
-    def from_dict(cls, data: dict) -> "Ticket":
+    def from_dict(cls, data: dict, log_loader=None) -> "Ticket":
+        return cls(**cls._fields_from_dict(data), log_loader=log_loader)
+
+    @staticmethod
+    def _fields_from_dict(data: dict) -> dict:
         ign_data = data.get("ign")
         ign = IGN.from_dict(ign_data) if ign_data else None
-        return cls(
+        return dict(
             ticket_id=data.get("ticket_id"),
             user_id=data.get("user_id"),
             channel_id=data.get("channel_id"),
@@ -80,54 +299,179 @@ class Ticket:
             status=data.get("status", "open"),
             created_at=data.get("created_at"),
             updated_at=data.get("updated_at"),
-            logs=data.get("logs", []),
+            logs=data.get("logs"),
             last_closed_at=data.get("last_closed_at"),
             last_reopened_at=data.get("last_reopened_at"),
+            authors=data.get("authors"),
         )
 
-    def add_log(self, message: str):
-        timestamp = datetime.now(timezone.utc).isoformat()
-        self.logs.append({"timestamp": timestamp, "message": message})
-        self.updated_at = timestamp
+    def set_author(self, author_id: str, name: str) -> bool:
+        # Returns whether the author table changed.
+        if self.authors is None:
+            self.authors = {}
+        elif self.authors.get(author_id) == name:
+            return False
+        self.authors[author_id] = name
+        return True
+
+    def add_log(self, content: str, entry_type: str = LOG_SYSTEM, author_id: str = None,
+                message_id: str = None) -> dict:
+        timestamp = _now()
+        entry = make_log_entry(unpack_timestamp(timestamp), content, entry_type, author_id, message_id)
+        if self._logs is not None or self.log_loader is None:
+            self.logs.append(entry)
+        self._updated_at = timestamp
+        return entry
+
+
+class LazyTicket(Ticket):
+    # A ticket loaded from a binary snapshot. The fields in SNAPSHOT_INDEX_FIELDS come from the snapshot
+    # index; the rest is decoded from the record the first time any other attribute is read or any
+    # attribute is set, after which it behaves exactly like a Ticket.
+    __slots__ = ("_record",)
+
+    def __init__(self, record: SnapshotRecord, log_loader=None):
+        # Through object.__setattr__: __setattr__ below would decode the record right away.
+        set_slot = object.__setattr__
+        user_id, channel_id, status, updated_at = record.fields
+        set_slot(self, "_record", record)
+        set_slot(self, "ticket_id", record.ticket_id)
+        set_slot(self, "user_id", user_id)
+        set_slot(self, "channel_id", channel_id)
+        set_slot(self, "status", sys.intern(status) if status else status)
+        set_slot(self, "_updated_at", pack_timestamp(updated_at))
+        set_slot(self, "_logs", None)
+        set_slot(self, "log_loader", log_loader)
+
+    @property
+    def snapshot_record(self) -> SnapshotRecord:
+        return self._record
+
+    def _decode(self):
+        record = self._record
+        if record is None:
+            return
+        object.__setattr__(self, "_record", None)
+        logs = self._logs
+        Ticket.__init__(self, **Ticket._fields_from_dict(record.decode()), log_loader=self.log_loader)
+        self._logs = logs
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name == "_record" or self._record is None:
+            raise AttributeError(name)
+        self._decode()
+        return getattr(self, name)
+
+    def __setattr__(self, name, value):
+        self._decode()
+        object.__setattr__(self, name, value)
 
 
 class TicketHandler:
-    def __init__(self, storage_file="data/tickets.json"):
-        self.storage_file = storage_file
-        os.makedirs(os.path.dirname(self.storage_file), exist_ok=True)
+    def __init__(self, storage_file="data/tickets.json", storage=None, flush_interval=5.0, flush_threshold=50,
+                 archive=None):
+        self.storage = storage or JSONTicketStorage(storage_file)
+        self.archive = archive or TicketArchive(os.path.join(os.path.dirname(storage_file), "archive"))
+        self.flusher = FlushScheduler(self._prepare_flush, flush_interval, flush_threshold, name="tickets")
+        # Loading allocates a few objects per ticket and none of them are garbage, so the cyclic collector
+        # would only keep rescanning the growing heap; it is paused until the working set is built.
+        gc_enabled = gc.isenabled()
+        gc.disable()
         try:
-            with open(self.storage_file, "r") as f:
-                tickets_data = json.load(f)
-                self.tickets = {
-                    ticket_id: Ticket.from_dict(ticket_dict)
-                    for ticket_id, ticket_dict in tickets_data.items()
-                }
-        except FileNotFoundError:
-            self.tickets = {}
+            self.tickets = {
+                ticket_id: (
+                    Ticket.from_dict(ticket_data, log_loader=self.storage.load_logs) if isinstance(ticket_data, dict)
+                    else LazyTicket(ticket_data, log_loader=self.storage.load_logs)
+                )
+                for ticket_id, ticket_data in self.storage.load().items()
+            }
+            self.by_channel_id = {}
+            self.open_by_user_id = {}
+            for ticket in self.tickets.values():
+                self._index(ticket)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._id_lock = threading.Lock()
+        self._reserved_ids = set()
+        self._last_ticket_number = max(
+            [
+                self.storage.last_ticket_number,
+                *(int(ticket_id) for ticket_id in self.tickets),
+                self.archive.max_ticket_number(),
+            ]
+        )
+        # A ticket is in both tiers after a crash mid-archive or after a restore. An unchanged working copy
+        # is evicted again; one that changed since supersedes the archived copy.
+        self.evict_archived({
+            ticket_id: {"updated_at": updated_at}
+            for ticket_id, updated_at in self.archive.updated_at_for(self.tickets).items()
+        })
+
+    def _index(self, ticket: Ticket):
+        if ticket.channel_id and ticket.channel_id != "deleted":
+            self.by_channel_id[ticket.channel_id] = ticket.ticket_id
+        if ticket.status == "open":
+            self.open_by_user_id.setdefault(ticket.user_id, set()).add(ticket.ticket_id)
+
+    def _unindex(self, ticket: Ticket):
+        if self.by_channel_id.get(ticket.channel_id) == ticket.ticket_id:
+            del self.by_channel_id[ticket.channel_id]
+        open_ids = self.open_by_user_id.get(ticket.user_id)
+        if open_ids:
+            open_ids.discard(ticket.ticket_id)
+            if not open_ids:
+                del self.open_by_user_id[ticket.user_id]
+
+    def _persisted(self):
+        self.flusher.mark_dirty()
+
+    def _prepare_flush(self):
+        return self.storage.prepare_flush(self.tickets)
+
+    def flush(self):
+        self.flusher.flush()
 
     def save(self):
-        with open(self.storage_file, "w") as f:
-            json.dump(
-                {ticket_id: ticket.to_dict() for ticket_id, ticket in self.tickets.items()},
-                f,
-                indent=4,
-            )
+        self.flusher.dirty = 0
+        with FLUSH_SECONDS.time(store="tickets_compact"):
+            self.storage.prepare_flush(self.tickets, compact=True)()
 
-    def _generate_ticket_id(self) -> str:
-        if self.tickets:
-            max_id = max(int(ticket_id) for ticket_id in self.tickets.keys())
-            next_id = max_id + 1
+    @staticmethod
+    def _format_ticket_id(number: int) -> str:
+        if number < 1000:
+            return str(number).zfill(3)
         else:
-            next_id = 1
+            return str(number).zfill(4)
 
-        if next_id < 1000:
-            return str(next_id).zfill(3)
-        else:
-            return str(next_id).zfill(4)
+    def reserve_ticket_id(self) -> str:
+        with self._id_lock:
+            self._last_ticket_number += 1
+            ticket_id = self._format_ticket_id(self._last_ticket_number)
+            self._reserved_ids.add(ticket_id)
+            self.storage.record_allocate(self._last_ticket_number)
+        self._persisted()
+        return ticket_id
+
+    def release_ticket_id(self, ticket_id: str):
+        with self._id_lock:
+            if ticket_id not in self._reserved_ids:
+                return
+            self._reserved_ids.discard(ticket_id)
+            # Only the newest reservation can be handed back without breaking monotonicity.
+            if int(ticket_id) == self._last_ticket_number:
+                self._last_ticket_number -= 1
+                self.storage.record_allocate(self._last_ticket_number)
+        self._persisted()
 
     def create_ticket(self, user_id: str, channel_id: str, subject: str, reason: str, ign_username: str,
-                      category: str = "General Support") -> Ticket:
-        ticket_id = self._generate_ticket_id()
+                      category: str = "General Support", ticket_id: str = None) -> Ticket:
+        if ticket_id is None:
+            ticket_id = self.reserve_ticket_id()
+        with self._id_lock:
+            if ticket_id not in self._reserved_ids:
+                raise ValueError(f"Ticket ID {ticket_id} was not reserved")
+            self._reserved_ids.discard(ticket_id)
         ign = IGN(ign_username)
         new_ticket = Ticket(
             ticket_id=ticket_id,
@@ -137,59 +481,185 @@ class TicketHandler:
             reason=reason,
             category=category,
             ign=ign,
+            log_loader=self.storage.load_logs,
         )
         self.tickets[new_ticket.ticket_id] = new_ticket
-        self.save()
+        self._index(new_ticket)
+        self.storage.record_create(new_ticket.to_dict(include_logs=False))
+        self._persisted()
         return new_ticket
 
     def delete_ticket(self, ticket_id: str):
         if ticket_id in self.tickets:
-            del self.tickets[ticket_id]
-            self.save()
+            self._unindex(self.tickets.pop(ticket_id))
+            self.storage.record_delete(ticket_id)
+            self._persisted()
+        if ticket_id in self.archive:
+            self.archive.discard({ticket_id})
 
     def update_ticket(self, ticket_id: str, **kwargs) -> Ticket:
         ticket = self.tickets.get(ticket_id)
         if ticket:
             old_status = ticket.status
+            self._unindex(ticket)
+            changed = []
             for key, value in kwargs.items():
                 if key == "ign" and isinstance(value, str):
                     setattr(ticket, key, IGN(value))
-                elif hasattr(ticket, key):
+                    changed.append(key)
+                elif hasattr(ticket, key) and key != "logs":
                     setattr(ticket, key, value)
-            ticket.updated_at = datetime.now(timezone.utc).isoformat()
+                    changed.append(key)
+            ticket._updated_at = _now()
+            changed.append("updated_at")
             if 'status' in kwargs and kwargs['status'] == "open" and old_status != "open":
-                ticket.last_reopened_at = ticket.updated_at
-            self.save()
+                ticket._last_reopened_at = ticket._updated_at
+                changed.append("last_reopened_at")
+            self._index(ticket)
+            ticket_dict = ticket.to_dict(include_logs=False)
+            self.storage.record_update(ticket_id, {key: ticket_dict[key] for key in changed})
+            self._persisted()
         return ticket
 
-    def add_ticket_log(self, ticket_id: str, message: str) -> Ticket:
+    def add_ticket_log(self, ticket_id: str, message: str, entry_type: str = LOG_SYSTEM, author_id: str = None,
+                       display_name: str = None, message_id: str = None) -> Ticket:
         ticket = self.tickets.get(ticket_id)
         if ticket:
-            ticket.add_log(message)
-            self.save()
+            if author_id is not None and display_name is not None and ticket.set_author(author_id, display_name):
+                self.storage.record_update(ticket_id, {"authors": dict(ticket.authors)})
+            entry = ticket.add_log(message, entry_type, author_id, message_id)
+            self.storage.record_log(ticket_id, entry)
+            self._persisted()
         return ticket
 
-    def add_ticket_log_with_user(self, ticket_id: str, user_id: str, display_name: str, message: str) -> Ticket:
-        log_message = f"[{display_name} ({user_id})]: {message}"
-        return self.add_ticket_log(ticket_id, log_message)
+    def add_ticket_log_with_user(self, ticket_id: str, user_id: str, display_name: str, message: str,
+                                 message_id: str = None, entry_type: str = LOG_MESSAGE) -> Ticket:
+        return self.add_ticket_log(ticket_id, message, entry_type, user_id, display_name, message_id)
 
     def close_ticket(self, ticket_id: str, closing_message: str = None) -> Ticket:
         ticket = self.tickets.get(ticket_id)
         if ticket:
+            self._unindex(ticket)
             ticket.status = "closed"
+            self._index(ticket)
             if closing_message:
-                ticket.add_log(f"Ticket closed: {closing_message}")
+                entry = ticket.add_log(f"Ticket closed: {closing_message}")
             else:
-                ticket.add_log("Ticket closed.")
-            ticket.last_closed_at = datetime.now(timezone.utc).isoformat()
-            self.save()
+                entry = ticket.add_log("Ticket closed.")
+            ticket._last_closed_at = _now()
+            self.storage.record_close(ticket_id, entry, ticket.last_closed_at)
+            self._persisted()
         return ticket
 
     def list_tickets(self) -> list:
         return list(self.tickets.values())
 
+    def get_by_channel(self, channel_id: str) -> Ticket:
+        ticket_id = self.by_channel_id.get(channel_id)
+        if ticket_id:
+            return self.tickets.get(ticket_id)
+        # A closed ticket whose channel is still around comes back from the archive when it is used.
+        ticket_id = self.archive.ticket_for_channel(channel_id)
+        return self.restore_ticket(ticket_id) if ticket_id else None
+
+    async def aget_by_channel(self, channel_id: str, check_archive: bool = True) -> Ticket:
+        # get_by_channel for the event loop: the archive index and the archived copy are read in an
+        # executor. Callers that know the channel can't be an archived ticket pass check_archive=False,
+        # which keeps the answer for non-ticket channels to a dict lookup.
+        ticket_id = self.by_channel_id.get(channel_id)
+        if ticket_id:
+            return self.tickets.get(ticket_id)
+        if not check_archive:
+            return None
+
+        def lookup():
+            archived_id = self.archive.ticket_for_channel(channel_id)
+            return archived_id, self.archive.get(archived_id) if archived_id else None
+
+        ticket_id, record = await asyncio.get_running_loop().run_in_executor(None, lookup)
+        if not ticket_id:
+            return None
+        if ticket_id in self.tickets:
+            # Restored by someone else while this one was reading.
+            return self.tickets[ticket_id]
+        return self.restore_ticket(ticket_id, record)
+
+    def find_ticket(self, ticket_id: str) -> Ticket:
+        # For audits: looks in the archive too, without moving the ticket back into the working set.
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None and ticket_id in self.archive:
+            record = self.archive.get(ticket_id)
+            if record:
+                ticket_dict, logs = record
+                ticket = Ticket.from_dict({**ticket_dict, "logs": logs})
+        return ticket
+
+    def prepare_archive(self, older_than: timedelta):
+        # Closed tickets untouched for `older_than`. The returned job writes them to the archive (blocking)
+        # and returns what it archived, to be passed to evict_archived back on the event loop.
+        cutoff = time.time() - older_than.total_seconds()
+        candidates = {
+            ticket_id: ticket.to_dict(include_logs=False)
+            for ticket_id, ticket in self.tickets.items()
+            if ticket.status == "closed" and ticket.updated_ts < cutoff
+        }
+
+        def job():
+            self.archive.write([
+                (ticket_dict, self.storage.load_logs(ticket_id)) for ticket_id, ticket_dict in candidates.items()
+            ])
+            return candidates
+
+        return job
+
+    def evict_archived(self, archived: dict) -> int:
+        evicted = 0
+        stale = set()
+        for ticket_id, ticket_dict in archived.items():
+            ticket = self.tickets.get(ticket_id)
+            if ticket is None:
+                continue
+            if ticket.status != "closed" or ticket.updated_at != ticket_dict["updated_at"]:
+                # Reopened or written to while it was being archived; the working copy is the real one.
+                stale.add(ticket_id)
+                continue
+            self._unindex(self.tickets.pop(ticket_id))
+            self.storage.record_delete(ticket_id)
+            evicted += 1
+        if stale:
+            self.archive.discard(stale)
+        if evicted:
+            self._persisted()
+        return evicted
+
+    async def archive_old_tickets(self, older_than: timedelta) -> int:
+        archived = await asyncio.get_running_loop().run_in_executor(None, self.prepare_archive(older_than))
+        return self.evict_archived(archived)
+
+    def restore_ticket(self, ticket_id: str, record=None) -> Ticket:
+        # `record` is what archive.get(ticket_id) returned, when the caller has already read it.
+        if record is None:
+            record = self.archive.get(ticket_id)
+        if record is None:
+            return None
+        ticket_dict, logs = record
+        ticket = Ticket.from_dict(ticket_dict, log_loader=self.storage.load_logs)
+        self.tickets[ticket_id] = ticket
+        self._index(ticket)
+        self.storage.record_restore(ticket.to_dict(include_logs=False), logs)
+        # The archived copy stays indexed until the ticket is archived again or changes, so nothing is
+        # lost if the process dies before the restore is flushed; the working copy always wins.
+        self._persisted()
+        return ticket
+
+    def get_open_for_user(self, user_id: str) -> Ticket:
+        open_ids = self.open_by_user_id.get(user_id)
+        if not open_ids:
+            return None
+        return self.tickets.get(max(open_ids, key=int))
+
     def has_open_ticket(self, user_id: str) -> bool:
-        return any(ticket.user_id == user_id and ticket.status == "open" for ticket in self.tickets.values())
+        return user_id in self.open_by_user_id
 
 
 if __name__ == "__main__":
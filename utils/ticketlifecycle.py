@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import deque
+
+from interactions import PermissionOverwrite, Permissions
+
+from utils.metrics import registry
+from utils.tasks import spawn
+
+CHANNEL_EDITS = registry.counter(
+    "bot_ticket_channel_edits_total", "Ticket channel state changes by what was sent to Discord.", ("kind",)
+)
+
+
+class TicketLifecycle:
+    # Puts a ticket channel's name and permission overwrites in line with the ticket's status. Both go
+    # out in a single PATCH, and only the parts that differ from what the channel already has. Discord
+    # allows `rename_limit` renames per channel every `rename_window` seconds; a rename past that is held
+    # back and sent on its own once the window allows, while the overwrites are still applied right away.
+    def __init__(self, support_role_id: int, rename_limit: int = 2, rename_window: float = 600.0):
+        self.support_role_id = support_role_id
+        self.rename_limit = rename_limit
+        self.rename_window = rename_window
+        self._renames = {}
+        self._deferred = {}
+        # What was last sent for each channel. The cached channel object only catches up once the gateway
+        # echoes the update back, which a quick close/reopen can beat.
+        self._sent = {}
+        self._tasks = set()
+
+    @staticmethod
+    def channel_name(ticket_id: str, status: str) -> str:
+        return f"ticket-{ticket_id}" if status == "open" else f"closed-{ticket_id}"
+
+    @staticmethod
+    def may_be_closed_ticket(channel) -> bool:
+        # Only closed tickets get archived, and their channels carry the closed- name.
+        return str(getattr(channel, "name", None) or "").startswith("closed-")
+
+    def overwrites(self, guild_id, user_id, status: str) -> list:
+        if status == "open":
+            owner = PermissionOverwrite(id=user_id, type=1, allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES)
+        else:
+            owner = PermissionOverwrite(id=user_id, type=1, allow=Permissions.VIEW_CHANNEL,
+                                        deny=Permissions.SEND_MESSAGES)
+        return [
+            PermissionOverwrite(id=guild_id, type=0, deny=Permissions.VIEW_CHANNEL),
+            owner,
+            PermissionOverwrite(id=self.support_role_id, type=0,
+                                allow=Permissions.VIEW_CHANNEL | Permissions.SEND_MESSAGES),
+        ]
+
+    @staticmethod
+    def _overwrite_key(overwrites) -> set:
+        return {
+            (int(overwrite.id), int(overwrite.type), int(overwrite.allow or 0), int(overwrite.deny or 0))
+            for overwrite in overwrites or ()
+        }
+
+    def _rename_delay(self, channel_id: int) -> float:
+        recent = self._renames.get(channel_id)
+        if recent is None:
+            return 0.0
+        now = time.monotonic()
+        while recent and now - recent[0] >= self.rename_window:
+            recent.popleft()
+        if len(recent) < self.rename_limit:
+            return 0.0
+        return self.rename_window - (now - recent[0])
+
+    def _record_rename(self, channel_id: int):
+        self._renames.setdefault(channel_id, deque()).append(time.monotonic())
+
+    async def apply(self, channel, ticket, guild_id):
+        channel_id = int(channel.id)
+        name = self.channel_name(ticket.ticket_id, ticket.status)
+        overwrites = self.overwrites(guild_id, ticket.user_id, ticket.status)
+        self._cancel_rename(channel_id)
+
+        sent = self._sent.setdefault(channel_id, {})
+        changes = {}
+        current_overwrites = sent.get("overwrites")
+        if current_overwrites is None:
+            current_overwrites = self._overwrite_key(getattr(channel, "permission_overwrites", None))
+        if current_overwrites != self._overwrite_key(overwrites):
+            changes["permission_overwrites"] = overwrites
+        if sent.get("name", getattr(channel, "name", None)) != name:
+            delay = self._rename_delay(channel_id)
+            if delay > 0:
+                timer = asyncio.get_running_loop().call_later(delay, self._fire_rename, channel, name)
+                self._deferred[channel_id] = timer
+                CHANNEL_EDITS.inc(kind="rename_deferred")
+            else:
+                changes["name"] = name
+                # Counted before the request goes out so a concurrent toggle sees it.
+                self._record_rename(channel_id)
+
+        if not changes:
+            CHANNEL_EDITS.inc(kind="skipped")
+            return
+        CHANNEL_EDITS.inc(kind="name_and_permissions" if len(changes) == 2 else next(iter(changes)))
+        if "name" in changes:
+            sent["name"] = name
+        if "permission_overwrites" in changes:
+            sent["overwrites"] = self._overwrite_key(overwrites)
+        try:
+            await channel.edit(**changes)
+        except Exception as e:
+            # Nothing is known about what Discord applied; go back to the cached channel next time.
+            self._sent.pop(channel_id, None)
+            print("Error updating ticket channel:", e)
+
+    def _fire_rename(self, channel, name: str):
+        self._deferred.pop(int(channel.id), None)
+        spawn(self._rename(channel, name), self._tasks, "Error renaming ticket channel:")
+
+    async def _rename(self, channel, name: str):
+        channel_id = int(channel.id)
+        sent = self._sent.setdefault(channel_id, {})
+        if sent.get("name", getattr(channel, "name", None)) == name:
+            return
+        self._record_rename(channel_id)
+        CHANNEL_EDITS.inc(kind="name")
+        sent["name"] = name
+        try:
+            await channel.edit(name=name)
+        except Exception as e:
+            sent.pop("name", None)
+            print("Error renaming ticket channel:", e)
+
+    def _cancel_rename(self, channel_id: int):
+        # A held-back rename is superseded by whatever state the ticket moves to next.
+        timer = self._deferred.pop(channel_id, None)
+        if timer:
+            timer.cancel()
+
+    def forget(self, channel_id):
+        # For deleted channels.
+        channel_id = int(channel_id)
+        self._cancel_rename(channel_id)
+        self._renames.pop(channel_id, None)
+        self._sent.pop(channel_id, None)
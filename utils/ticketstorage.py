@@ -0,0 +1,762 @@
+import contextlib
+import gzip
+import json
+import os
+import sqlite3
+import struct
+import threading
+
+from utils.flusher import atomic_write_json, read_jsonl
+
+SNAPSHOT_MAGIC = b"TKTSNAP1"
+# Kept in the snapshot index so tickets can be indexed and filtered without decoding them.
+SNAPSHOT_INDEX_FIELDS = ("user_id", "channel_id", "status", "updated_at")
+
+
+class SnapshotRecord:
+    # One ticket in a binary snapshot, decoded only when something asks for it.
+    __slots__ = ("buffer", "offset", "ticket_id", "fields")
+
+    def __init__(self, buffer, offset: int, ticket_id: str, fields: list):
+        self.buffer = buffer
+        self.offset = offset
+        self.ticket_id = ticket_id
+        self.fields = fields
+
+    def raw(self) -> bytes:
+        (length,) = struct.unpack_from(">I", self.buffer, self.offset)
+        start = self.offset + 4
+        return self.buffer[start:start + length]
+
+    def decode(self) -> dict:
+        return json.loads(self.raw())
+
+
+def write_binary_snapshot(path: str, tickets: dict, last_ticket_number: int):
+    # Layout: magic, then one length-prefixed compact JSON record per ticket, then a JSON index of
+    # [ticket_id, offset, *SNAPSHOT_INDEX_FIELDS] rows, then the index offset and the magic again.
+    # Records that are still undecoded SnapshotRecords are copied over byte for byte.
+    index = []
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        offset = len(SNAPSHOT_MAGIC)
+        for ticket_id, ticket in tickets.items():
+            if isinstance(ticket, SnapshotRecord):
+                data, fields = ticket.raw(), list(ticket.fields)
+            else:
+                data = json.dumps(ticket, separators=(",", ":")).encode()
+                fields = [ticket.get(name) for name in SNAPSHOT_INDEX_FIELDS]
+            f.write(struct.pack(">I", len(data)))
+            f.write(data)
+            index.append([ticket_id, offset, *fields])
+            offset += 4 + len(data)
+        f.write(json.dumps({"last_ticket_number": last_ticket_number, "tickets": index}, separators=(",", ":")).encode())
+        f.write(struct.pack(">Q", offset))
+        f.write(SNAPSHOT_MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def read_binary_snapshot(path: str):
+    # Returns ({ticket_id: SnapshotRecord}, last_ticket_number). Only the index is parsed; the records
+    # stay as raw bytes until they are decoded. The file is read into memory rather than mapped so that
+    # nothing keeps it open and compaction can replace it on every platform.
+    with open(path, "rb") as f:
+        buffer = f.read()
+    trailer = len(buffer) - 8 - len(SNAPSHOT_MAGIC)
+    if trailer < len(SNAPSHOT_MAGIC) or buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC \
+            or buffer[trailer + 8:] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a ticket snapshot")
+    (index_offset,) = struct.unpack_from(">Q", buffer, trailer)
+    index = json.loads(buffer[index_offset:trailer])
+    records = {
+        row[0]: SnapshotRecord(buffer, row[1], row[0], row[2:]) for row in index["tickets"]
+    }
+    return records, index["last_ticket_number"]
+
+
+def _lines_within(f, size: int):
+    for line in f:
+        if size <= 0:
+            return
+        size -= len(line)
+        yield line
+
+
+class TranscriptSegments:
+    # One append-only JSON Lines file per ticket. Appends are buffered until the next flush; reads
+    # merge what is on disk with what is still buffered.
+    def __init__(self, directory="data/transcripts"):
+        self.directory = directory
+        self._pending = {}
+        self._inflight = {}
+        self._io_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, ticket_id: str) -> str:
+        return os.path.join(self.directory, f"{ticket_id}.jsonl")
+
+    def exists(self, ticket_id: str) -> bool:
+        return os.path.isfile(self.path(ticket_id))
+
+    def append(self, ticket_id: str, entry: dict):
+        # No lock: this runs on the event loop, and _io_lock is held for whole segment writes. setdefault
+        # and append are each atomic, which is all the swap and the requeue below rely on.
+        self._pending.setdefault(ticket_id, []).append(entry)
+
+    def iter_entries(self, ticket_id: str):
+        # Snapshot the file length together with the buffers so an in-progress flush can neither
+        # duplicate nor drop entries; the file itself is then streamed without holding the lock.
+        with self._io_lock:
+            buffered = [*self._inflight.get(ticket_id, ()), *self._pending.get(ticket_id, ())]
+            try:
+                size = os.path.getsize(self.path(ticket_id))
+            except FileNotFoundError:
+                size = 0
+        if size:
+            with open(self.path(ticket_id), "rb") as f:
+                yield from read_jsonl(_lines_within(f, size))
+        yield from buffered
+
+    def load(self, ticket_id: str) -> list:
+        return list(self.iter_entries(ticket_id))
+
+    def write_all(self, ticket_id: str, entries: list):
+        tmp_file = self.path(ticket_id) + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        os.replace(tmp_file, self.path(ticket_id))
+
+    def delete(self, ticket_id: str):
+        with self._io_lock:
+            # Taking it out of the in-flight batch too keeps that write from recreating the file; the
+            # batch is only written while holding this lock, so it is either all before this or after.
+            self._pending.pop(ticket_id, None)
+            self._inflight.pop(ticket_id, None)
+            try:
+                os.remove(self.path(ticket_id))
+            except FileNotFoundError:
+                pass
+
+    def prepare_flush(self):
+        # Swapped under the lock so iter_entries always finds an entry in one buffer or the other.
+        with self._io_lock:
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+
+        def write():
+            with self._io_lock:
+                try:
+                    for ticket_id in list(batch):
+                        with open(self.path(ticket_id), "a") as f:
+                            f.write("".join(json.dumps(entry) + "\n" for entry in batch[ticket_id]))
+                        del batch[ticket_id]
+                except Exception:
+                    # What wasn't written goes back in front of anything appended since, where reads and
+                    # the next flush find it.
+                    for ticket_id, entries in batch.items():
+                        self._pending.setdefault(ticket_id, [])[:0] = entries
+                    raise
+                finally:
+                    self._inflight = {}
+
+        return write
+
+
+class JSONTicketStorage:
+    # snapshot_format picks what compaction writes: "json" (tickets.json) or "binary" (tickets.snap, see
+    # write_binary_snapshot). Either one is read back, whichever was written last.
+    def __init__(self, storage_file="data/tickets.json", journal=True, compact_every=1000, transcripts_dir=None,
+                 snapshot_format="json"):
+        self.storage_file = storage_file
+        self.snapshot_format = snapshot_format
+        self.snapshot_file = os.path.splitext(storage_file)[0] + ".snap"
+        self.journal = journal
+        self.journal_file = os.path.splitext(storage_file)[0] + ".journal"
+        self.compact_every = compact_every
+        self.transcripts = TranscriptSegments(
+            transcripts_dir or os.path.join(os.path.dirname(storage_file), "transcripts")
+        )
+        self._journal_fh = None
+        self._journal_records = 0
+        self._pending = []
+        self._migrated_logs = False
+        self._convert_snapshot = False
+        self._retry_compaction = False
+        self.last_ticket_number = 0
+        os.makedirs(os.path.dirname(self.storage_file), exist_ok=True)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return (not self.journal or self._migrated_logs or self._convert_snapshot or self._retry_compaction
+                or self._journal_records >= self.compact_every)
+
+    def _latest_snapshot(self):
+        candidates = [
+            (os.path.getmtime(path), fmt) for path, fmt in
+            ((self.storage_file, "json"), (self.snapshot_file, "binary")) if os.path.isfile(path)
+        ]
+        return max(candidates)[1] if candidates else None
+
+    # With a binary snapshot the values are SnapshotRecords for every ticket the journal didn't touch;
+    # pass lazy=False to get plain dicts throughout.
+    def load(self, lazy: bool = True) -> dict:
+        source = self._latest_snapshot()
+        if source == "binary":
+            tickets, self.last_ticket_number = read_binary_snapshot(self.snapshot_file)
+        elif source == "json":
+            with open(self.storage_file, "r") as f:
+                tickets = json.load(f)
+        else:
+            tickets = {}
+        self._convert_snapshot = source is not None and source != self.snapshot_format
+        if self.journal:
+            self._replay_journal(tickets)
+        if not lazy:
+            tickets = {
+                ticket_id: ticket.decode() if isinstance(ticket, SnapshotRecord) else ticket
+                for ticket_id, ticket in tickets.items()
+            }
+        for ticket_id, ticket in tickets.items():
+            if not isinstance(ticket, dict):
+                continue
+            # Snapshots from before transcripts were split out carry their logs inline.
+            logs = ticket.pop("logs", None)
+            if logs is None:
+                continue
+            self._migrated_logs = True
+            if logs and not self.transcripts.exists(ticket_id):
+                self.transcripts.write_all(ticket_id, logs)
+        return tickets
+
+    def load_logs(self, ticket_id: str) -> list:
+        return self.transcripts.load(ticket_id)
+
+    def iter_logs(self, ticket_id: str):
+        return self.transcripts.iter_entries(ticket_id)
+
+    # Every journal record carries absolute values, so replaying a journal on top of a snapshot that
+    # already contains some of it yields the same state.
+    def _replay_journal(self, tickets: dict):
+        try:
+            with open(self.journal_file, "r") as f:
+                records = list(read_jsonl(f))
+        except FileNotFoundError:
+            return
+        for record in records:
+            self._apply_record(tickets, record)
+            self._journal_records += 1
+
+    def _apply_record(self, tickets: dict, record: dict):
+        op = record["op"]
+        if op == "allocate":
+            self.last_ticket_number = record["number"]
+            return
+        ticket_id = record["ticket_id"]
+        if op == "create":
+            tickets[ticket_id] = record["ticket"]
+            return
+        if op == "delete":
+            tickets.pop(ticket_id, None)
+            return
+        ticket = tickets.get(ticket_id)
+        if ticket is None:
+            return
+        if isinstance(ticket, SnapshotRecord):
+            ticket = tickets[ticket_id] = ticket.decode()
+        if op == "close":
+            ticket["status"] = "closed"
+            ticket["last_closed_at"] = record["last_closed_at"]
+            ticket["updated_at"] = record["updated_at"]
+        elif op == "update":
+            ticket.update(record["fields"])
+
+    def _append_journal(self, op: str, ticket_id: str = None, **data):
+        record = {"op": op, **data} if ticket_id is None else {"op": op, "ticket_id": ticket_id, **data}
+        self._pending.append(record)
+        self._journal_records += 1
+
+    def record_allocate(self, number: int):
+        self.last_ticket_number = number
+        self._append_journal("allocate", number=number)
+
+    def record_create(self, ticket_dict: dict):
+        self._append_journal("create", ticket_dict["ticket_id"], ticket=ticket_dict)
+
+    def record_update(self, ticket_id: str, fields: dict):
+        self._append_journal("update", ticket_id, fields=fields)
+
+    def record_log(self, ticket_id: str, entry: dict):
+        self.transcripts.append(ticket_id, entry)
+        self._append_journal("update", ticket_id, fields={"updated_at": entry["timestamp"]})
+
+    def record_close(self, ticket_id: str, entry: dict, last_closed_at: str):
+        self.transcripts.append(ticket_id, entry)
+        self._append_journal(
+            "close", ticket_id, updated_at=entry["timestamp"], last_closed_at=last_closed_at
+        )
+
+    def record_delete(self, ticket_id: str):
+        self.transcripts.delete(ticket_id)
+        self._append_journal("delete", ticket_id)
+
+    def record_restore(self, ticket_dict: dict, logs: list):
+        ticket_id = ticket_dict["ticket_id"]
+        self.transcripts.delete(ticket_id)
+        for entry in logs:
+            self.transcripts.append(ticket_id, entry)
+        self._append_journal("create", ticket_id, ticket=ticket_dict)
+
+    def prepare_flush(self, tickets: dict, compact: bool = False):
+        write_transcripts = self.transcripts.prepare_flush()
+        records, self._pending = self._pending, []
+        if compact or self.needs_compaction:
+            snapshot = {
+                ticket_id: ticket.snapshot_record or ticket.to_dict(include_logs=False)
+                for ticket_id, ticket in tickets.items()
+            }
+            # The snapshot only implies the highest *existing* ticket ID, so carry the allocator over.
+            allocate = {"op": "allocate", "number": self.last_ticket_number}
+            self._journal_records = 1
+            self._migrated_logs = False
+            self._convert_snapshot = False
+            self._retry_compaction = False
+
+            def write():
+                try:
+                    write_transcripts()
+                    self._write_snapshot(snapshot, allocate)
+                except Exception:
+                    self._retry_compaction = True
+                    self._requeue(records)
+                    raise
+        else:
+            def write():
+                try:
+                    write_transcripts()
+                    self._write_records(records)
+                except Exception:
+                    self._requeue(records)
+                    raise
+
+        return write
+
+    def _requeue(self, records: list):
+        # Puts the records of a failed flush back in front of those journaled since. Records hold
+        # absolute values, so writing some of them twice after a partial failure replays the same.
+        self._pending[:0] = records
+
+    def _write_records(self, records: list):
+        if not records:
+            return
+        if self._journal_fh is None:
+            self._journal_fh = open(self.journal_file, "a")
+        end = self._journal_fh.tell()
+        try:
+            self._journal_fh.write("".join(json.dumps(record) + "\n" for record in records))
+            self._journal_fh.flush()
+        except Exception:
+            # Drop the handle along with whatever it still buffers and cut the file back, so the retry
+            # isn't written behind a torn line that replay would stop at.
+            journal_fh, self._journal_fh = self._journal_fh, None
+            with contextlib.suppress(OSError):
+                journal_fh.close()
+            with contextlib.suppress(OSError):
+                os.truncate(self.journal_file, end)
+            raise
+
+    def _write_snapshot(self, snapshot: dict, allocate: dict):
+        if self.snapshot_format == "binary":
+            write_binary_snapshot(self.snapshot_file, snapshot, allocate["number"])
+            stale_file = self.storage_file
+        else:
+            atomic_write_json(self.storage_file, {
+                ticket_id: ticket.decode() if isinstance(ticket, SnapshotRecord) else ticket
+                for ticket_id, ticket in snapshot.items()
+            }, indent=4)
+            stale_file = self.snapshot_file
+        if os.path.isfile(stale_file):
+            os.remove(stale_file)
+        if self.journal:
+            if self._journal_fh is not None:
+                self._journal_fh.close()
+            self._journal_fh = open(self.journal_file, "w")
+            self._write_records([allocate])
+
+    def close(self):
+        if self._journal_fh is not None:
+            self._journal_fh.close()
+            self._journal_fh = None
+
+
+class SQLiteTicketStorage:
+    needs_compaction = False
+    COLUMNS = (
+        "ticket_id", "user_id", "channel_id", "subject", "reason", "category", "ign",
+        "status", "created_at", "updated_at", "last_closed_at", "last_reopened_at", "authors",
+    )
+    LOG_COLUMNS = "timestamp, message, type, author_id, message_id"
+
+    def __init__(self, db_file="data/tickets.db", migrate_from="data/tickets.json"):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        # Buffered statements are executed from the flush executor thread.
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._pending = []
+        self._pending_logs = {}
+        self._inflight_logs = {}
+        self._io_lock = threading.Lock()
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tickets (
+                ticket_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                channel_id TEXT,
+                subject TEXT,
+                reason TEXT,
+                category TEXT,
+                ign TEXT,
+                status TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                last_closed_at TEXT,
+                last_reopened_at TEXT,
+                authors TEXT
+            );
+            CREATE TABLE IF NOT EXISTS ticket_logs (
+                ticket_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                timestamp TEXT,
+                message TEXT,
+                type TEXT,
+                author_id TEXT,
+                message_id TEXT,
+                PRIMARY KEY (ticket_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_tickets_channel_id ON tickets (channel_id);
+            CREATE INDEX IF NOT EXISTS idx_tickets_user_status ON tickets (user_id, status);
+            CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets (created_at);
+        """)
+        self.conn.commit()
+        if migrate_from:
+            self.migrate_from_json(migrate_from)
+
+    @staticmethod
+    def _log_values(entry: dict) -> tuple:
+        # Structured entries keep their content in the message column; legacy ones have no type.
+        if "type" in entry:
+            return (entry.get("timestamp"), entry.get("content"), entry["type"], entry.get("author_id"),
+                    entry.get("message_id"))
+        return entry.get("timestamp"), entry.get("message"), None, None, None
+
+    @staticmethod
+    def _log_entry(timestamp, message, entry_type, author_id, message_id) -> dict:
+        if entry_type is None:
+            return {"timestamp": timestamp, "message": message}
+        return {
+            "timestamp": timestamp,
+            "type": entry_type,
+            "author_id": author_id,
+            "message_id": message_id,
+            "content": message,
+        }
+
+    def migrate_from_json(self, json_file: str):
+        source = JSONTicketStorage(json_file)
+        if not any(os.path.isfile(path) for path in (json_file, source.snapshot_file, source.journal_file)):
+            return
+        if self.conn.execute("SELECT 1 FROM tickets LIMIT 1").fetchone():
+            return
+        tickets = source.load(lazy=False)
+        source.close()
+        with self.conn:
+            self._set_meta("last_ticket_number", source.last_ticket_number)
+            for ticket_dict in tickets.values():
+                self._insert_ticket(ticket_dict)
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO ticket_logs (ticket_id, idx, {self.LOG_COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (ticket_dict["ticket_id"], index, *self._log_values(entry))
+                        for index, entry in enumerate(source.load_logs(ticket_dict["ticket_id"]))
+                    ],
+                )
+        # Keep the old files around as a backup, but out of the way so the import only ever runs once.
+        for path in (json_file, source.snapshot_file, source.journal_file):
+            if os.path.isfile(path):
+                os.replace(path, path + ".migrated")
+
+    @property
+    def last_ticket_number(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_ticket_number'").fetchone()
+        return int(row["value"]) if row else 0
+
+    def _set_meta(self, key: str, value):
+        self.conn.execute(*self._meta_statement(key, value))
+
+    @staticmethod
+    def _meta_statement(key: str, value):
+        return "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+
+    def _ticket_statement(self, ticket_dict: dict):
+        row = dict(ticket_dict)
+        row["ign"] = json.dumps(row.get("ign"))
+        row["authors"] = json.dumps(row["authors"]) if row.get("authors") else None
+        return (
+            f"INSERT OR REPLACE INTO tickets ({', '.join(self.COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+            [row.get(column) for column in self.COLUMNS],
+        )
+
+    def _insert_ticket(self, ticket_dict: dict):
+        self.conn.execute(*self._ticket_statement(ticket_dict))
+
+    def load(self) -> dict:
+        tickets = {}
+        for row in self.conn.execute("SELECT * FROM tickets"):
+            ticket_dict = dict(row)
+            ticket_dict["ign"] = json.loads(ticket_dict["ign"]) if ticket_dict["ign"] else None
+            ticket_dict["authors"] = json.loads(ticket_dict["authors"]) if ticket_dict["authors"] else None
+            tickets[ticket_dict["ticket_id"]] = ticket_dict
+        return tickets
+
+    def load_logs(self, ticket_id: str) -> list:
+        with self._io_lock:
+            rows = self.conn.execute(
+                f"SELECT {self.LOG_COLUMNS} FROM ticket_logs WHERE ticket_id = ? ORDER BY idx", (ticket_id,)
+            ).fetchall()
+            buffered = [*self._inflight_logs.get(ticket_id, ()), *self._pending_logs.get(ticket_id, ())]
+        return [self._log_entry(*row) for row in rows] + buffered
+
+    def iter_logs(self, ticket_id: str):
+        # Streams from a connection of its own (WAL lets it read alongside the writer), up to the last
+        # row that existed when the buffers were snapshotted, so nothing is duplicated or dropped.
+        with self._io_lock:
+            row = self.conn.execute("SELECT MAX(idx) FROM ticket_logs WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            last_idx = row[0]
+            buffered = [*self._inflight_logs.get(ticket_id, ()), *self._pending_logs.get(ticket_id, ())]
+        if last_idx is not None:
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.execute(
+                    f"SELECT {self.LOG_COLUMNS} FROM ticket_logs WHERE ticket_id = ? AND idx <= ? ORDER BY idx",
+                    (ticket_id, last_idx),
+                )
+                for row in cursor:
+                    yield self._log_entry(*row)
+            finally:
+                conn.close()
+        yield from buffered
+
+    def record_allocate(self, number: int):
+        self._pending.append(self._meta_statement("last_ticket_number", number))
+
+    def record_create(self, ticket_dict: dict):
+        self._pending.append(self._ticket_statement(ticket_dict))
+
+    def record_update(self, ticket_id: str, fields: dict):
+        fields = {key: value for key, value in fields.items() if key in self.COLUMNS and key != "ticket_id"}
+        if not fields:
+            return
+        if "ign" in fields:
+            fields["ign"] = json.dumps(fields["ign"])
+        if "authors" in fields:
+            fields["authors"] = json.dumps(fields["authors"]) if fields["authors"] else None
+        self._pending.append((
+            f"UPDATE tickets SET {', '.join(f'{key} = ?' for key in fields)} WHERE ticket_id = ?",
+            [*fields.values(), ticket_id],
+        ))
+
+    def record_log(self, ticket_id: str, entry: dict):
+        self._pending_logs.setdefault(ticket_id, []).append(entry)
+        self._pending.append((
+            f"INSERT INTO ticket_logs (ticket_id, idx, {self.LOG_COLUMNS}) "
+            "SELECT ?, COALESCE(MAX(idx) + 1, 0), ?, ?, ?, ?, ? FROM ticket_logs WHERE ticket_id = ?",
+            (ticket_id, *self._log_values(entry), ticket_id),
+        ))
+        self._pending.append((
+            "UPDATE tickets SET updated_at = ? WHERE ticket_id = ?", (entry["timestamp"], ticket_id)
+        ))
+
+    def record_close(self, ticket_id: str, entry: dict, last_closed_at: str):
+        self.record_log(ticket_id, entry)
+        self._pending.append((
+            "UPDATE tickets SET status = 'closed', last_closed_at = ? WHERE ticket_id = ?",
+            (last_closed_at, ticket_id),
+        ))
+
+    def record_delete(self, ticket_id: str):
+        self._pending_logs.pop(ticket_id, None)
+        self._pending.append(("DELETE FROM ticket_logs WHERE ticket_id = ?", (ticket_id,)))
+        self._pending.append(("DELETE FROM tickets WHERE ticket_id = ?", (ticket_id,)))
+
+    def record_restore(self, ticket_dict: dict, logs: list):
+        ticket_id = ticket_dict["ticket_id"]
+        self._pending_logs[ticket_id] = list(logs)
+        self._pending.append(("DELETE FROM ticket_logs WHERE ticket_id = ?", (ticket_id,)))
+        self._pending.append(self._ticket_statement(ticket_dict))
+        self._pending.extend(
+            (
+                f"INSERT INTO ticket_logs (ticket_id, idx, {self.LOG_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ticket_id, index, *self._log_values(entry)),
+            )
+            for index, entry in enumerate(logs)
+        )
+
+    def prepare_flush(self, tickets: dict, compact: bool = False):
+        statements, self._pending = self._pending, []
+        # Swapped under the lock so load_logs and iter_logs always find an entry in one buffer or the other.
+        with self._io_lock:
+            self._inflight_logs, self._pending_logs = self._pending_logs, {}
+        return lambda: self._write_statements(statements, checkpoint=compact)
+
+    def _write_statements(self, statements: list, checkpoint: bool = False):
+        with self._io_lock:
+            try:
+                if statements:
+                    with self.conn:
+                        for sql, params in statements:
+                            self.conn.execute(sql, params)
+            except Exception:
+                # The transaction rolled back; the batch goes back in front of what was recorded since.
+                self._pending[:0] = statements
+                for ticket_id, entries in self._inflight_logs.items():
+                    self._pending_logs.setdefault(ticket_id, [])[:0] = entries
+                raise
+            finally:
+                self._inflight_logs = {}
+        if checkpoint:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self.conn.close()
+
+
+class TicketArchive:
+    # Cold storage for tickets that have been closed for a while. Each month gets a gzip segment of
+    # {"ticket": ..., "logs": [...]} lines that is only ever appended to, one gzip member per batch.
+    # index.db maps ticket IDs to their segment and the offset of the member holding them, so nothing
+    # about archived tickets is held in memory and a lookup decompresses a single batch.
+    def __init__(self, directory="data/archive"):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.db")
+        # _io_lock covers the index connection only, so a lookup never waits on segment I/O; _write_lock
+        # keeps batches from interleaving in a segment.
+        self._io_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.index_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS archived (
+                ticket_id TEXT PRIMARY KEY,
+                segment TEXT NOT NULL,
+                member_offset INTEGER NOT NULL,
+                channel_id TEXT,
+                updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_archived_channel_id ON archived (channel_id);
+        """)
+        self.conn.commit()
+
+    def segment_path(self, segment: str) -> str:
+        return os.path.join(self.directory, f"{segment}.jsonl.gz")
+
+    def _entry(self, ticket_id: str):
+        with self._io_lock:
+            return self.conn.execute(
+                "SELECT segment, member_offset FROM archived WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+
+    def __contains__(self, ticket_id: str) -> bool:
+        return self._entry(ticket_id) is not None
+
+    def ticket_for_channel(self, channel_id: str) -> str:
+        if not channel_id or channel_id == "deleted":
+            return None
+        with self._io_lock:
+            row = self.conn.execute(
+                "SELECT ticket_id FROM archived WHERE channel_id = ? LIMIT 1", (channel_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def max_ticket_number(self) -> int:
+        with self._io_lock:
+            row = self.conn.execute("SELECT MAX(CAST(ticket_id AS INTEGER)) FROM archived").fetchone()
+        return row[0] or 0
+
+    def updated_at_for(self, ticket_ids) -> dict:
+        # {ticket_id: updated_at} for those of `ticket_ids` that are archived.
+        ticket_ids = list(ticket_ids)
+        found = {}
+        with self._io_lock:
+            for start in range(0, len(ticket_ids), 500):
+                chunk = ticket_ids[start:start + 500]
+                found.update(self.conn.execute(
+                    f"SELECT ticket_id, updated_at FROM archived WHERE ticket_id IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                ).fetchall())
+        return found
+
+    def write(self, records: list):
+        # records: (ticket_dict, logs) pairs. Blocking; segments are fsynced before the index names
+        # them, so the caller may drop its own copy once this returns.
+        segments = {}
+        for ticket_dict, logs in records:
+            segment = (ticket_dict.get("updated_at") or ticket_dict["created_at"])[:7]
+            segments.setdefault(segment, []).append({"ticket": ticket_dict, "logs": logs})
+        if not segments:
+            return
+        rows = []
+        with self._write_lock:
+            for segment, lines in segments.items():
+                with open(self.segment_path(segment), "ab") as raw:
+                    offset = raw.tell()
+                    # Each batch is its own gzip member; readers see the members as one stream.
+                    with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                        f.write("".join(json.dumps(line) + "\n" for line in lines).encode())
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                rows.extend(
+                    (line["ticket"]["ticket_id"], segment, offset, line["ticket"].get("channel_id"),
+                     line["ticket"].get("updated_at"))
+                    for line in lines
+                )
+        with self._io_lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO archived (ticket_id, segment, member_offset, channel_id, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def discard(self, ticket_ids):
+        # Segments are left as they are; a ticket that is not in the index is simply not archived.
+        with self._io_lock, self.conn:
+            self.conn.executemany("DELETE FROM archived WHERE ticket_id = ?", [(ticket_id,) for ticket_id in ticket_ids])
+
+    def get(self, ticket_id: str):
+        # Returns (ticket_dict, logs) or None. Blocking: decompresses the batch the ticket was last
+        # archived in.
+        entry = self._entry(ticket_id)
+        if entry is None:
+            return None
+        segment, offset = entry
+        marker = f'"ticket_id": "{ticket_id}"'.encode()
+        with open(self.segment_path(segment), "rb") as raw:
+            raw.seek(offset)
+            for record in read_jsonl(gzip.GzipFile(fileobj=raw, mode="rb"), marker):
+                if record["ticket"]["ticket_id"] == ticket_id:
+                    return record["ticket"], record["logs"]
+        return None
+
+    def close(self):
+        self.conn.close()
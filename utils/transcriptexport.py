@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from utils.flusher import atomic_write_json
+from utils.metrics import registry
+from utils.tickethandler import LOG_ATTACHMENT, LOG_SYSTEM, read_log_entry
+
+EXPORT_SECONDS = registry.histogram(
+    "bot_transcript_export_seconds", "Time to render a ticket transcript.", ("outcome",)
+)
+
+
+class TranscriptExporter:
+    # Renders ticket transcripts to Markdown in a small thread pool. Log entries are streamed from
+    # `iter_logs(ticket_id)` and written out a page at a time, so a ticket is never held in memory whole.
+    # Jobs are listed in queue.json until they finish and each export records its progress after every
+    # page, so resume() picks up where a restart left off.
+    def __init__(self, iter_logs, export_dir="data/exports", max_workers=2, page_size=500):
+        self.iter_logs = iter_logs
+        self.export_dir = export_dir
+        self.queue_file = os.path.join(export_dir, "queue.json")
+        self.page_size = page_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcript-export")
+        os.makedirs(self.export_dir, exist_ok=True)
+        try:
+            with open(self.queue_file, "r") as f:
+                self.jobs = json.load(f)
+        except FileNotFoundError:
+            self.jobs = {}
+        self._running = set()
+        self._queue_lock = threading.Lock()
+        self._queue_version = 0
+        self._queue_written = 0
+
+    def export(self, ticket, reason: str) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        job_id = f"{ticket.ticket_id}-{stamp}-{reason}"
+        self.jobs[job_id] = {
+            "ticket": ticket.to_dict(include_logs=False),
+            "reason": reason,
+            "directory": os.path.join(self.export_dir, job_id),
+        }
+        self._save_queue()
+        self._submit(job_id)
+        return self.jobs[job_id]["directory"]
+
+    def _save_queue(self):
+        # The job list is copied on the event loop and written (with its fsync) in the default executor.
+        # Writes can finish out of order, so one that a newer copy has already overtaken is skipped.
+        self._queue_version += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self._write_queue, self._queue_version, dict(self.jobs)
+        )
+        future.add_done_callback(self._queue_saved)
+
+    @staticmethod
+    def _queue_saved(future):
+        if not future.cancelled() and future.exception() is not None:
+            print("Error saving the transcript export queue:", future.exception())
+
+    def _write_queue(self, version: int, jobs: dict):
+        with self._queue_lock:
+            if version < self._queue_written:
+                return
+            atomic_write_json(self.queue_file, jobs, indent=4)
+            self._queue_written = version
+
+    def resume(self):
+        for job_id in list(self.jobs):
+            self._submit(job_id)
+
+    def _submit(self, job_id: str):
+        if job_id in self._running:
+            return
+        self._running.add(job_id)
+        future = asyncio.get_running_loop().run_in_executor(self._pool, self._run, dict(self.jobs[job_id]))
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+
+    def _finished(self, job_id: str, future):
+        self._running.discard(job_id)
+        if future.exception() is not None:
+            # Left in the queue; it is retried on the next resume().
+            print(f"Error exporting transcript {job_id}:", future.exception())
+            return
+        self.jobs.pop(job_id, None)
+        self._save_queue()
+
+    def _run(self, job: dict):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            self._render(job)
+            outcome = "ok"
+        finally:
+            EXPORT_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+    def _render(self, job: dict):
+        directory = job["directory"]
+        ticket = job["ticket"]
+        os.makedirs(directory, exist_ok=True)
+        progress_file = os.path.join(directory, "progress.json")
+        try:
+            with open(progress_file, "r") as f:
+                progress = json.load(f)
+        except FileNotFoundError:
+            progress = {"pages": 0, "entries": 0}
+        if progress.get("done"):
+            return
+
+        entries = itertools.islice(self.iter_logs(ticket["ticket_id"]), progress["entries"], None)
+        while True:
+            page = list(itertools.islice(entries, self.page_size))
+            if not page and progress["pages"]:
+                break
+            number = progress["pages"] + 1
+            self._write_page(directory, number, ticket, job["reason"], page, progress["entries"])
+            progress = {"pages": number, "entries": progress["entries"] + len(page)}
+            atomic_write_json(progress_file, progress)
+            if len(page) < self.page_size:
+                break
+
+        self._write_index(directory, ticket, job["reason"], progress)
+        atomic_write_json(progress_file, {**progress, "done": True})
+
+    @staticmethod
+    def _page_name(number: int) -> str:
+        return f"page-{number:04d}.md"
+
+    def _write_page(self, directory: str, number: int, ticket: dict, reason: str, page: list, first: int):
+        lines = [f"# Ticket {ticket['ticket_id']} transcript, page {number}", ""]
+        if number == 1:
+            lines += self._header(ticket, reason)
+        authors = ticket.get("authors")
+        for offset, entry in enumerate(page, start=first + 1):
+            lines.append(f"{offset}. {self._format_entry(read_log_entry(entry, authors))}")
+        if not page:
+            lines.append("_No messages were logged._")
+        path = os.path.join(directory, self._page_name(number))
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _format_entry(entry: dict) -> str:
+        content = (entry["content"] or "").replace("\n", "\n  ")
+        author = ""
+        if entry["author_id"]:
+            author = f"**{entry['author_name'] or 'Unknown'}** (<@{entry['author_id']}>)"
+        if entry["type"] == LOG_SYSTEM:
+            text = f"_{content}_ ({author})" if author else f"_{content}_"
+        elif entry["type"] == LOG_ATTACHMENT:
+            text = f"{author} sent {content}"
+        else:
+            text = f"{author}: {content}" if author else content
+        return f"`{entry['timestamp'] or ''}` {text}"
+
+    @staticmethod
+    def _header(ticket: dict, reason: str) -> list:
+        ign = (ticket.get("ign") or {}).get("username", "")
+        return [
+            f"- **Subject:** {ticket.get('subject', '')}",
+            f"- **Category:** {ticket.get('category', '')}",
+            f"- **Opened by:** <@{ticket.get('user_id')}> ({ign})",
+            f"- **Reason:** {ticket.get('reason', '')}",
+            f"- **Created:** {ticket.get('created_at')}",
+            f"- **Closed:** {ticket.get('last_closed_at')}",
+            f"- **Exported on:** ticket {reason}",
+            "",
+        ]
+
+    def _write_index(self, directory: str, ticket: dict, reason: str, progress: dict):
+        lines = [f"# Ticket {ticket['ticket_id']} transcript", ""] + self._header(ticket, reason)
+        lines.append(f"{progress['entries']} messages across {progress['pages']} page(s):")
+        lines += [f"- [{self._page_name(n)}]({self._page_name(n)})" for n in range(1, progress["pages"] + 1)]
+        path = os.path.join(directory, "index.md")
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)